@@ -1,9 +1,23 @@
 
 import streamlit as st
-import json
-import os
+import csv
 import hashlib
-from datetime import datetime
+import io
+import math
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import bulk
+import jsonio
+from storage import open_storage, post_cursor, CATEGORY_ALL, POSTS_PER_PAGE, USERS_PER_PAGE
+from changefeed import FeedView
+from render import (page_cache, post_card_html, overview_hero_html, overview_politics_md,
+                    history_eras, defense_dashboard_html, trend_chart_html, activity_chart_html)
+from assets import IMAGE_SLOTS, InvalidImageError, image_url, store_image, fetch_all, slot_ref
+from metrics import registry as metrics, start_exporters
+from shared import state as shared
 
 # ==========================================
 # 1. 초기 설정 및 유틸리티
@@ -16,6 +30,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# 전체 재실행 시간 계측 시작 (st.rerun / st.stop 으로 중단된 실행은 기록하지 않는다)
+run_started = time.perf_counter()
+
 # Custom CSS로 React의 Tailwind 느낌 구현
 st.markdown("""
 <style>
@@ -72,43 +89,262 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# 파일 경로 및 해시 함수
-DATA_FILE = 'nation_data.json'
+# 해시 함수 및 저장 대기 시간
+COMMIT_TIMEOUT = 10
+# 자유 광장 목록 자동 갱신 주기(초). 0 이면 끈다
+FEED_POLL_SECONDS = float(os.environ.get('NATION_FEED_POLL_SECONDS', '5'))
+CULTURE_IMAGE = "https://images.unsplash.com/photo-1532439778267-3a1375765715?auto=format&fit=crop&q=80&w=800"
+# 데이터에 이미지가 없을 때 화면이 대신 쓰는 이미지 (이미지 자리 -> URL)
+IMAGE_DEFAULTS = {'culture': CULTURE_IMAGE}
 DEFAULT_HASH = "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9" # admin123
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return None 
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-# 세션 초기화
-if 'data' not in st.session_state:
-    loaded = load_data()
-    if loaded:
-        st.session_state.data = loaded
+# 국가 데이터는 프로세스 전체가 하나의 사본을 공유한다
+@st.cache_resource
+def get_store():
+    start_exporters()
+    return open_storage()
+
+store = get_store()
+if not store.data:
+    get_store.clear()
+    st.error("데이터 파일(nation_data.json)이 없습니다. 코드를 다시 배포해주세요.")
+    st.stop()
+store.refresh()
+# 다른 복제본이 알린 프로세스 캐시 무효화 (shared.py)
+shared.poll()
+
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+metrics.touch_session(st.session_state.session_id)
+metrics.inc('reruns_total')
+
+# 로그인 세션은 공유 상태(shared.py)에 두고, 세션에는 역할과 시민 ID 를 따로 적는다.
+# 토큰은 이 접속의 세션 상태에 두고, 다른 곳에서 끝난 세션(로그아웃, 추방, 비밀번호 변경)은 여기서도 끝난다.
+# 시민 세션은 브라우저에 묶을 수 있을 때만 토큰을 주소(?sid=)에도 남겨 새로고침이나 다른 복제본으로의
+# 재접속 뒤에도 이어지게 한다. 주소의 토큰은 한 번 쓰면 새 토큰으로 바뀌고, 묶인 브라우저에서만 쓸 수 있다.
+# 관리자 토큰은 주소에 남기지 않는다 (새로고침하면 관리자 코드를 다시 입력한다).
+XSRF_COOKIE = '_streamlit_xsrf'
+
+def client_bind():
+    # 브라우저에만 있는 값: Streamlit 의 XSRF 쿠키 속 토큰의 해시. 주소, 화면, 방문 기록을 복사해도 따라가지 않는다.
+    # 쿠키 값은 요청마다 다른 마스크로 다시 씌워지므로 마스크를 벗긴 토큰을 쓴다 ('2|마스크|토큰|시각').
+    # XSRF 보호를 끈 서버라 쿠키가 없으면 None (그때는 주소에 토큰을 남기지 않는다)
+    raw = st.context.cookies.get(XSRF_COOKIE, '').strip('"\'')
+    try:
+        version, mask, masked, _ = raw.split('|')
+        mask, masked = bytes.fromhex(mask), bytes.fromhex(masked)
+    except ValueError:
+        return None
+    if version != '2' or not mask or not masked:
+        return None
+    token = bytes(b ^ mask[i % len(mask)] for i, b in enumerate(masked))
+    return hashlib.sha256(token).hexdigest()
+
+def login(user):
+    info = {"role": "admin"} if user == 'admin' else {"role": "citizen", "username": user['username']}
+    bind = client_bind()
+    token = shared.create_session(info, bind)
+    st.session_state.login_token = token
+    if info['role'] == 'citizen' and bind:
+        st.query_params['sid'] = token
+    st.session_state.user = user
+
+def logout():
+    token = st.session_state.pop('login_token', None)
+    if token:
+        shared.end_session(token)
+    if 'sid' in st.query_params:
+        del st.query_params['sid']
+    st.session_state.user = None
+
+def session_user():
+    token = st.session_state.get('login_token')
+    bind = client_bind()
+    if token is None and 'sid' in st.query_params:
+        # 새 접속: 주소의 토큰을 새 토큰으로 바꿔 받는다
+        rotated = shared.rotate_session(st.query_params['sid'], bind) if bind else None
+        if rotated is None or rotated[1]['role'] != 'citizen':
+            del st.query_params['sid']
+        else:
+            token = st.session_state.login_token = st.query_params['sid'] = rotated[0]
+    info = shared.session_user(token, bind) if token else None
+    if info is None:
+        user = None
+    elif info['role'] == 'admin':
+        user = 'admin'
     else:
-        st.error("데이터 파일(nation_data.json)이 없습니다. 코드를 다시 배포해주세요.")
+        user = store.get_user(info['username'])
+    if token and user is None:
+        logout()
+    return user
+
+st.session_state.user = session_user()
+
+# 기다리지 않은 기록(글 등록, 신고)의 Future. 실패하면 다음 실행에서 알린다
+if 'pending_writes' not in st.session_state:
+    st.session_state.pending_writes = []
+
+failed_writes = [f for f in st.session_state.pending_writes if f.done() and f.exception()]
+st.session_state.pending_writes = [f for f in st.session_state.pending_writes if not f.done()]
+if failed_writes:
+    st.error(f"변경 사항 {len(failed_writes)}건을 저장하지 못했습니다. 다시 시도해주세요.")
+
+# 변경은 기록기 스레드가 모아서 저장한다. wait=True 면 기록 완료까지 확인한다
+def commit(op, wait=False):
+    future = store.commit(op)
+    if not wait:
+        st.session_state.pending_writes.append(future)
+        return
+    try:
+        future.result(timeout=COMMIT_TIMEOUT)
+    except Exception:
+        st.error("저장하지 못했습니다. 잠시 후 다시 시도해주세요.")
         st.stop()
 
-if 'user' not in st.session_state:
-    st.session_state.user = None
+# 글 등록 / 신고 / 로그인 시도 제한. 막히면 notify 로 알리고 False
+def allowed(action, notify=st.warning):
+    user = st.session_state.user
+    key = 'admin' if user == 'admin' else user['username'] if user else st.session_state.session_id
+    wait = shared.rate_hit(action, key)
+    if wait:
+        notify(f"요청이 너무 잦습니다. {math.ceil(wait)}초 후 다시 시도해주세요.")
+    return not wait
+
+# 자유 광장 페이지 커서 스택 (첫 페이지는 None)
+if 'feed_cursors' not in st.session_state:
+    st.session_state.feed_cursors = [None]
+
+def reset_feed():
+    st.session_state.feed_cursors = [None]
+
+def date_bounds(dates):
+    # date_input 의 (시작일, 끝일) -> 시작일 0시부터 끝일 다음 날 0시 전까지 (초). 덜 골랐으면 (None, None)
+    if len(dates) != 2:
+        return None, None
+    since = datetime.combine(dates[0], datetime.min.time()).timestamp()
+    until = datetime.combine(dates[1] + timedelta(days=1), datetime.min.time()).timestamp()
+    return since, until
+
+# 자유 광장 목록. 세션이 보던 페이지(FeedView)에 저장소 변경 기록의 새 연산만 반영하고,
+# 일정 주기로 이 영역만 다시 실행해 다른 세션의 글 등록/삭제를 보여준다.
+@st.fragment(run_every=FEED_POLL_SECONDS or None)
+def live_feed(category, since=None, until=None):
+    store.refresh()
+    cursors = st.session_state.feed_cursors
+    view = st.session_state.get('feed_view')
+    if view is None or not view.matches(store, category, cursors[-1], since, until):
+        view = st.session_state.feed_view = FeedView(store, category, cursors[-1], POSTS_PER_PAGE, post_cursor,
+                                                     since, until)
+    page = view.sync()
+    if view.added:
+        st.caption(f"🔄 새 글 {view.added}건")
+    with metrics.timer('feed_render', mode='page'):
+        for post in page:
+            render_post(post)
+
+    # 페이지 이동
+    nav_prev, nav_page, nav_next = st.columns([1, 4, 1])
+    if len(cursors) > 1 and nav_prev.button("◀ 이전", use_container_width=True):
+        cursors.pop()
+        st.rerun()
+    nav_page.caption(f"{len(cursors)} 페이지")
+    if view.next_cursor and nav_next.button("다음 ▶", use_container_width=True):
+        cursors.append(view.next_cursor)
+        st.rerun()
+
+# 자유 광장 게시글 카드 + 관리/신고 버튼
+def render_post(post):
+    with st.container():
+        st.markdown(post_card_html(post), unsafe_allow_html=True)
+        post_actions(post)
 
-if 'admin_pw_hash' not in st.session_state:
-    st.session_state.admin_pw_hash = DEFAULT_HASH
+# 신고 버튼은 이 영역만 다시 실행한다 (삭제는 목록이 바뀌므로 전체 재실행)
+@st.fragment
+def post_actions(post):
+    col_a, col_b = st.columns([1, 5])
+    if st.session_state.user == 'admin':
+        if col_a.button("삭제", key=f"del_{post['id']}"):
+            commit({"op": "delete_post", "id": post['id']})
+            st.rerun()
+    elif st.session_state.user:
+         if col_a.button("🚨 신고", key=f"rep_{post['id']}") and allowed('report', st.toast):
+             report = {"reporter": st.session_state.user['username'], "reason": "사용자 신고", "timestamp": datetime.now().timestamp()}
+             if store.report(post['id'], report):
+                 st.toast("신고가 접수되었습니다.")
+             else:
+                 st.toast("이미 신고한 글입니다.")
+
+# 국방/경제 지표 추이. 관리자 수정마다 쌓인 이력을 기간으로 잘라 줄인 뒤 그린다
+TREND_LABELS = {
+    "military": {"troopCount": "현역 병력", "tankCount": "전차/기갑", "shipCount": "함정",
+                 "aircraftCount": "전술기", "readinessLevel": "전투 준비 태세 (%)",
+                 "nuclearWarheads": "핵탄두", "defenseBudget": "국방 예산 (억 달러)"},
+    "economy": {"gdpGrowthRate": "성장률 (%)", "inflationRate": "물가상승률 (%)",
+                "unemploymentRate": "실업률 (%)", "tradeBalance": "무역수지 (억 달러)"},
+}
+TREND_PERIODS = {"전체": None, "1년": 365, "90일": 90, "7일": 7}
+# 게시판 활동 차트 기간 (일)
+ACTIVITY_PERIODS = {"30일": 30, "90일": 90, "1년": 365}
+
+@st.fragment
+def indicator_trends(name):
+    series = store.series.get(name)
+    st.subheader("📊 지표 추이")
+    if series.rows < 2:
+        st.caption("관리자가 지표를 수정할 때마다 추이가 기록됩니다.")
+        return
+    period = st.radio("기간", list(TREND_PERIODS), horizontal=True, key=f"trend_{name}")
+    days = TREND_PERIODS[period]
+    # 기간 시작은 시 단위로 맞춰 캐시를 재사용한다
+    since = None if days is None else (time.time() - days * 86400) // 3600 * 3600
+    # 기록은 숫자로 읽히는 값을 모두 남기지만, 차트는 지표로 정한 항목만 그린다
+    labels = TREND_LABELS[name]
+    columns = [c for c in labels if c in series.columns]
+
+    def build():
+        cards = []
+        for column in columns:
+            ts, values = series.window(column, since)
+            cards.append(trend_chart_html(labels[column], ts, values))
+        return cards
+
+    cards = page_cache.get((since, series.rows), ('trend', name, days), build)
+    cols = st.columns(3)
+    for i, card in enumerate(c for c in cards if c):
+        cols[i % 3].markdown(card, unsafe_allow_html=True)
 
 # ==========================================
 # 2. 사이드바 (네비게이션 & 로그인)
 # ==========================================
 
-with st.sidebar:
+# 로그인 입력은 이 영역만 다시 실행하고, 접속에 성공하면 전체를 다시 그린다
+@st.fragment
+def login_box():
+    with st.expander("🔒 로그인 / 입장", expanded=True):
+        login_tab1, login_tab2 = st.tabs(["시민", "관리자"])
+        with login_tab1:
+            c_id = st.text_input("ID", key="cid")
+            c_pw = st.text_input("PW", type="password", key="cpw")
+            if st.button("시민 접속", use_container_width=True) and allowed('login', st.error):
+                user = store.get_user(c_id)
+                if user and user['password'] == c_pw:
+                    login(user)
+                    st.rerun()
+                else:
+                    st.error("정보 불일치")
+        with login_tab2:
+            a_pw = st.text_input("관리자 코드", type="password", key="apw")
+            if st.button("집무실 입장", use_container_width=True) and allowed('login', st.error):
+                if hash_password(a_pw) == shared.get_setting('admin_pw_hash', DEFAULT_HASH):
+                    login('admin')
+                    st.rerun()
+                else:
+                    st.error("코드 오류 (초기: admin123)")
+
+with metrics.timer('sidebar'), st.sidebar:
     st.markdown("<div style='padding:1rem; text-align:center;'><h1 style='color:white;'>🏛️ SUPERPOWER</h1><p style='color:#94a3b8;'>Virtual Nation System v2.0</p></div>", unsafe_allow_html=True)
     
     # 로그인 처리
@@ -116,30 +352,10 @@ with st.sidebar:
         u_name = "대통령 (관리자)" if st.session_state.user == 'admin' else f"{st.session_state.user['username']} 시민"
         st.success(f"🟢 접속 중: {u_name}")
         if st.button("로그아웃", use_container_width=True):
-            st.session_state.user = None
+            logout()
             st.rerun()
     else:
-        with st.expander("🔒 로그인 / 입장", expanded=True):
-            login_tab1, login_tab2 = st.tabs(["시민", "관리자"])
-            with login_tab1:
-                c_id = st.text_input("ID", key="cid")
-                c_pw = st.text_input("PW", type="password", key="cpw")
-                if st.button("시민 접속", use_container_width=True):
-                    users = st.session_state.data.get('users', [])
-                    user = next((u for u in users if u['username'] == c_id and u['password'] == c_pw), None)
-                    if user:
-                        st.session_state.user = user
-                        st.rerun()
-                    else:
-                        st.error("정보 불일치")
-            with login_tab2:
-                a_pw = st.text_input("관리자 코드", type="password", key="apw")
-                if st.button("집무실 입장", use_container_width=True):
-                    if hash_password(a_pw) == st.session_state.admin_pw_hash:
-                        st.session_state.user = 'admin'
-                        st.rerun()
-                    else:
-                        st.error("코드 오류 (초기: admin123)")
+        login_box()
 
     st.markdown("---")
     
@@ -153,36 +369,23 @@ with st.sidebar:
     menu = st.radio("이동할 장소", menu_options)
     
     st.markdown("---")
-    st.caption(f"© 2024 {st.session_state.data['stats']['formalName']}")
+    st.caption(f"© 2024 {store.data['stats']['formalName']}")
 
 # ==========================================
 # 3. 메인 페이지 로직
 # ==========================================
 
-data = st.session_state.data
+data = store.data
 stats = data['stats']
 details = data['details']
+page_started = time.perf_counter()
 
 # --- [1] 국가 개요 ---
 if menu == "국가 개요":
     with st.container():
-        st.markdown(f"""
-        <div class="card" style="background: linear-gradient(135deg, #1e1b4b 0%, #312e81 100%); color: white;">
-            <div style="display:flex; align-items:center; justify-content:space-between; flex-wrap:wrap;">
-                <div>
-                    <h1 style="font-size:3rem; font-weight:800; margin-bottom:0;">{stats['formalName']}</h1>
-                    <p style="font-size:1.2rem; font-style:italic; opacity:0.8;">"{stats['motto']}"</p>
-                </div>
-                <img src="{stats['flag']}" style="width:150px; border-radius:10px; border:2px solid white; box-shadow:0 10px 15px -3px rgba(0,0,0,0.1);">
-            </div>
-            <div style="margin-top:2rem; display:flex; gap:2rem; flex-wrap:wrap;">
-                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">수도</span><br/>{stats['capital']}</div>
-                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">인구</span><br/>{stats['population']}</div>
-                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">화폐</span><br/>{stats['currency']}</div>
-                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">언어</span><br/>{stats['language']}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        flag_url = image_url(stats['flag'], 'card')
+        st.markdown(page_cache.get((store.part_version('stats'), flag_url), 'overview_hero',
+                                   lambda: overview_hero_html(stats, flag_url)), unsafe_allow_html=True)
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("총 GDP", stats['totalGdp'])
@@ -192,7 +395,7 @@ if menu == "국가 개요":
 
     c1, c2 = st.columns([1, 2])
     with c1:
-        st.image(stats['coatOfArms'], caption="국가 상징(국장)")
+        st.image(image_url(stats['coatOfArms'], 'card'), caption="국가 상징(국장)")
         with st.expander("국가 정보 더보기"):
             st.write(f"**도메인:** {stats['domain']}")
             st.write(f"**국가번호:** {stats['intlPhone']}")
@@ -200,14 +403,7 @@ if menu == "국가 개요":
             st.write(f"**민족:** {stats['ethnicity']}")
     with c2:
         st.subheader("⚖️ 정치 및 정부")
-        st.markdown(f"""
-        - **정치 체제:** {stats['politicalSystem']}
-        - **경제 체제:** {stats['economicSystem']}
-        - **국가 원수:** {stats['headOfState']}
-        - **정부 수반:** {stats['headOfGovernment']}
-        - **집권 여당:** {stats['rulingParty']}
-        - **의회:** {stats['parliament']}
-        """)
+        st.markdown(page_cache.get(store.part_version('stats'), 'overview_politics', lambda: overview_politics_md(stats)))
         st.info(stats['historyOverview'])
 
 # --- [2] 역사 기록실 ---
@@ -215,14 +411,9 @@ elif menu == "역사 기록실":
     st.title("📜 역사 기록실")
     st.markdown("국가의 유구한 역사를 기록하는 공간입니다.")
     
-    eras = {
-        "고대사 (Ancient)": details['history']['ancient'],
-        "중세사 (Medieval)": details['history']['medieval'],
-        "근대사 (Modern)": details['history']['modern'],
-        "현대사 (Contemporary)": details['history']['contemporary']
-    }
+    eras = page_cache.get(store.part_version('details.history'), 'history', lambda: history_eras(details['history']))
     
-    for title, content in eras.items():
+    for title, content in eras:
         with st.expander(title, expanded=True):
             st.write(content)
 
@@ -236,16 +427,10 @@ elif menu == "국방부 포털":
     overview_text = stats.get('militaryOverview', "국방 백서 요약 정보가 없습니다.")
     
     # Dashboard
-    st.markdown(f"""
-    <div class="card" style="background-color: #1e293b; color: white;">
-        <h3>🛡️ 국방 백서 요약</h3>
-        <p>{overview_text}</p>
-        <div style="margin-top:1rem; display:flex; gap:1rem;">
-            <div style="background:#dc2626; padding:0.5rem 1rem; border-radius:0.5rem; font-weight:bold;">데프콘 4단계</div>
-            <div style="background:#4f46e5; padding:0.5rem 1rem; border-radius:0.5rem; font-weight:bold;">준비태세 {num['readinessLevel']}%</div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(page_cache.get((store.part_version('stats'), store.part_version('details.military')),
+                               'defense_dashboard',
+                               lambda: defense_dashboard_html(overview_text, num['readinessLevel'])),
+                unsafe_allow_html=True)
     
     m1, m2, m3, m4 = st.columns(4)
     m1.metric("현역 병력", f"{num['troopCount']:,}")
@@ -268,6 +453,8 @@ elif menu == "국방부 포털":
     with tab3:
         st.markdown(f"### 📄 2024 국방 백서\n{mil['whitePaper']}")
 
+    indicator_trends("military")
+
 # --- [4] 경제 통계 ---
 elif menu == "경제 통계":
     st.title("📈 경제 지표")
@@ -288,6 +475,8 @@ elif menu == "경제 통계":
         st.write(f"**🔬 기술/R&D:** {eco['technology']}")
         st.write(f"**🚢 무역:** {eco['trade']}")
 
+    indicator_trends("economy")
+
 # --- [5] 문화/홍보 ---
 elif menu == "문화/홍보":
     st.title("🎭 문화 및 관광")
@@ -296,7 +485,7 @@ elif menu == "문화/홍보":
     
     col1, col2 = st.columns(2)
     with col1:
-        st.image("https://images.unsplash.com/photo-1532439778267-3a1375765715?auto=format&fit=crop&q=80&w=800", caption="문화의 중심")
+        st.image(image_url(cult.get('image', CULTURE_IMAGE), 'full'), caption="문화의 중심")
     with col2:
         st.metric("연간 관광객", cstats['annualTourists'])
         st.metric("소프트파워 순위", f"{cstats['globalSoftPowerRank']}위")
@@ -347,59 +536,40 @@ elif menu == "자유 광장":
                 p_title = st.text_input("제목")
                 p_cat = st.selectbox("카테고리", ["general", "petition"])
                 p_content = st.text_area("내용")
-                if st.form_submit_button("등록"):
+                if st.form_submit_button("등록") and allowed('post'):
                     new_post = {
                         "id": str(datetime.now().timestamp()),
                         "author": "대통령실" if st.session_state.user == 'admin' else st.session_state.user['username'],
                         "title": p_title,
                         "content": p_content,
                         "timestamp": datetime.now().timestamp(),
-                        "category": p_cat,
-                        "reports": []
+                        "category": p_cat
                     }
-                    st.session_state.data['posts'].insert(0, new_post)
-                    save_data(st.session_state.data)
+                    commit({"op": "add_post", "post": new_post})
+                    reset_feed()
                     st.success("등록 완료!")
                     st.rerun()
     else:
         st.warning("로그인한 시민만 글을 쓸 수 있습니다.")
 
     # 필터
-    cat_filter = st.selectbox("게시판 필터", ["전체", "자유", "신문고(청원)"])
+    f1, f2 = st.columns(2)
+    cat_filter = f1.selectbox("게시판 필터", ["전체", "자유", "신문고(청원)"], on_change=reset_feed)
+    category = {"전체": CATEGORY_ALL, "자유": "general", "신문고(청원)": "petition"}[cat_filter]
+    since, until = date_bounds(f2.date_input("작성일 (비우면 전체)", value=(), on_change=reset_feed, key="feed_dates"))
     
-    # 리스트 출력
-    for post in st.session_state.data['posts']:
-        if cat_filter == "자유" and post['category'] != "general": continue
-        if cat_filter == "신문고(청원)" and post['category'] != "petition": continue
-        
-        with st.container():
-            st.markdown(f"""
-            <div class="card">
-                <div style="display:flex; justify-content:space-between; align-items:center;">
-                    <span style="background-color:{'#fef3c7' if post['category']=='petition' else '#f1f5f9'}; color:{'#b45309' if post['category']=='petition' else '#64748b'}; padding:2px 8px; border-radius:4px; font-size:0.8rem; font-weight:bold;">
-                        {'📢 신문고' if post['category']=='petition' else '💬 자유'}
-                    </span>
-                    <span style="font-size:0.8rem; color:#94a3b8;">{datetime.fromtimestamp(post['timestamp'] / 1000 if post['timestamp'] > 10000000000 else post['timestamp']).strftime('%Y-%m-%d')}</span>
-                </div>
-                <h4 style="margin:0.5rem 0;">{post['title']}</h4>
-                <p style="font-size:0.9rem; color:#475569;">{post['content']}</p>
-                <div style="margin-top:0.5rem; font-size:0.8rem; color:#64748b;">
-                    작성자: <b>{post['author']}</b>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            col_a, col_b = st.columns([1, 5])
-            if st.session_state.user == 'admin':
-                if col_a.button("삭제", key=f"del_{post['id']}"):
-                    st.session_state.data['posts'] = [p for p in st.session_state.data['posts'] if p['id'] != post['id']]
-                    save_data(st.session_state.data)
-                    st.rerun()
-            elif st.session_state.user:
-                 if col_a.button("🚨 신고", key=f"rep_{post['id']}"):
-                     post['reports'].append({"reporter": st.session_state.user['username'], "reason": "사용자 신고", "timestamp": datetime.now().timestamp()})
-                     save_data(st.session_state.data)
-                     st.toast("신고가 접수되었습니다.")
+    query = st.text_input("🔎 게시글 검색", placeholder="제목, 내용, 작성자")
+    if query.strip():
+        results = store.search_posts(query, category)
+        if since is not None:
+            results = [p for p in results if since <= p['timestamp'] < until]
+        st.caption(f"검색 결과 {len(results)}건")
+        with metrics.timer('feed_render', mode='search'):
+            for post in results:
+                render_post(post)
+    else:
+        # 필터를 먼저 적용한 뒤 현재 페이지만 가져와 출력
+        live_feed(category, since, until)
 
 # --- [9] 대통령 집무실 (관리자) ---
 elif menu == "👑 대통령 집무실" and st.session_state.user == 'admin':
@@ -407,9 +577,11 @@ elif menu == "👑 대통령 집무실" and st.session_state.user == 'admin':
     st.info("여기서 변경하는 모든 내용은 실시간으로 국가 데이터에 반영됩니다.")
     
     # Python Streamlit Logic (Replaced Erroneous React Code)
-    admin_tab1, admin_tab2, admin_tab3, admin_tab4, admin_tab5 = st.tabs(["기본 정보", "군사력", "경제/사회", "역사", "시민 관리"])
+    admin_tab1, admin_tab2, admin_tab3, admin_tab4, admin_tab5, admin_tab6, admin_tab7, admin_tab8, admin_tab9 = st.tabs(["기본 정보", "군사력", "경제/사회", "역사", "시민 관리", "이미지", "신고 관리", "성능 지표", "데이터"])
 
-    with admin_tab1:
+    # 각 탭은 fragment 로 분리해 폼 입력/제출 시 해당 탭만 다시 실행한다
+    @st.fragment
+    def basic_info_tab():
         st.subheader("국가 기본 정보")
         with st.form("basic_form"):
             new_name = st.text_input("국가명", stats['formalName'])
@@ -417,15 +589,34 @@ elif menu == "👑 대통령 집무실" and st.session_state.user == 'admin':
             new_gdp = st.text_input("총 GDP", stats['totalGdp'])
             new_sys = st.text_input("정치 체제", stats['politicalSystem'])
             if st.form_submit_button("저장"):
-                stats['formalName'] = new_name
-                stats['population'] = new_pop
-                stats['totalGdp'] = new_gdp
-                stats['politicalSystem'] = new_sys
-                save_data(data)
+                commit({"op": "update", "path": ["stats"], "values": {
+                    "formalName": new_name,
+                    "population": new_pop,
+                    "totalGdp": new_gdp,
+                    "politicalSystem": new_sys,
+                }}, wait=True)
                 st.success("기본 정보가 수정되었습니다.")
                 st.rerun()
 
-    with admin_tab2:
+        # 관리자 코드는 공유 상태에 두므로 바꾸면 모든 서버 프로세스에 바로 적용된다
+        st.subheader("관리자 코드 변경")
+        with st.form("admin_pw_form"):
+            pw_new = st.text_input("새 관리자 코드", type="password")
+            pw_again = st.text_input("새 관리자 코드 확인", type="password")
+            if st.form_submit_button("변경"):
+                if not pw_new or pw_new != pw_again:
+                    st.error("코드가 비어 있거나 서로 다릅니다.")
+                else:
+                    # 예전 코드로 들어온 관리자 세션은 모두 끝나므로 이 브라우저는 새 세션으로 다시 로그인한다
+                    shared.set_setting('admin_pw_hash', hash_password(pw_new))
+                    login('admin')
+                    st.success("관리자 코드가 변경되었습니다. 다른 관리자 세션은 모두 로그아웃되었습니다.")
+
+    with admin_tab1:
+        basic_info_tab()
+
+    @st.fragment
+    def military_tab():
         st.subheader("국방력 조절")
         with st.form("mil_form"):
             mnum = details['military']['numerical']
@@ -436,50 +627,81 @@ elif menu == "👑 대통령 집무실" and st.session_state.user == 'admin':
             val_ready = st.slider("준비 태세 (%)", 0, 100, int(mnum['readinessLevel']))
             
             if st.form_submit_button("국방 데이터 갱신"):
-                mnum['troopCount'] = val_troops
-                mnum['tankCount'] = val_tanks
-                mnum['shipCount'] = val_ships
-                mnum['aircraftCount'] = val_aircraft
-                mnum['readinessLevel'] = val_ready
-                save_data(data)
+                commit({"op": "update", "path": ["details", "military", "numerical"], "values": {
+                    "troopCount": val_troops,
+                    "tankCount": val_tanks,
+                    "shipCount": val_ships,
+                    "aircraftCount": val_aircraft,
+                    "readinessLevel": val_ready,
+                }}, wait=True)
                 st.success("국방력이 재설정되었습니다.")
                 st.rerun()
 
-    with admin_tab3:
+    with admin_tab2:
+        military_tab()
+
+    @st.fragment
+    def economy_tab():
         st.subheader("경제 지표 수정")
         with st.form("eco_form"):
             e_gdp = st.text_input("GDP 성장률", details['economy']['stats']['gdpGrowthRate'])
             e_ind = st.text_input("주요 산업 (콤마 구분)", ", ".join(details['economy']['stats']['keyIndustries']))
             if st.form_submit_button("경제 지표 저장"):
-                details['economy']['stats']['gdpGrowthRate'] = e_gdp
-                details['economy']['stats']['keyIndustries'] = [x.strip() for x in e_ind.split(",")]
-                save_data(data)
+                commit({"op": "update", "path": ["details", "economy", "stats"], "values": {
+                    "gdpGrowthRate": e_gdp,
+                    "keyIndustries": [x.strip() for x in e_ind.split(",")],
+                }}, wait=True)
                 st.success("저장 완료")
 
-    with admin_tab4:
+    with admin_tab3:
+        economy_tab()
+
+    @st.fragment
+    def history_tab():
         st.subheader("역사 기록 수정")
         with st.form("hist_form"):
             h_ancient = st.text_area("고대사", details['history']['ancient'])
             h_modern = st.text_area("현대사", details['history']['contemporary'])
             if st.form_submit_button("역사 수정"):
-                details['history']['ancient'] = h_ancient
-                details['history']['contemporary'] = h_modern
-                save_data(data)
+                commit({"op": "update", "path": ["details", "history"], "values": {
+                    "ancient": h_ancient,
+                    "contemporary": h_modern,
+                }}, wait=True)
                 st.success("역사가 다시 쓰여졌습니다.")
 
-    with admin_tab5:
+    with admin_tab4:
+        history_tab()
+
+    @st.fragment
+    def citizens_tab():
         st.subheader("시민 계정 관리")
-        users = data.get('users', [])
-        
-        # User List
-        for u in users:
-            c1, c2, c3 = st.columns([2, 2, 1])
-            c1.write(f"**{u['username']}**")
-            c2.caption(f"가입일: {datetime.fromtimestamp(u['createdAt']).strftime('%Y-%m-%d')}")
-            if c3.button("추방", key=f"ban_btn_{u['username']}"):
-                data['users'] = [x for x in users if x['username'] != u['username']]
-                save_data(data)
-                st.rerun()
+
+        # 검색 + 페이지 (ID 접두어 검색은 색인 범위 조회)
+        c_q, c_p = st.columns([3, 1])
+        roster_q = c_q.text_input("ID 검색 (앞부분 일치)", key="roster_q",
+                                  on_change=lambda: st.session_state.update(roster_page=1))
+        total = store.count_users(roster_q)
+        pages = max(1, math.ceil(total / USERS_PER_PAGE))
+        if st.session_state.get('roster_page', 1) > pages:
+            st.session_state.roster_page = pages
+        roster_page = c_p.number_input("페이지", min_value=1, max_value=pages, step=1, key="roster_page")
+        users = store.list_users(roster_q, (roster_page - 1) * USERS_PER_PAGE, USERS_PER_PAGE)
+        st.caption(f"총 {total:,}명 · {roster_page}/{pages} 페이지")
+
+        # User List (선택한 시민을 한 번에 추방)
+        with st.form("ban_form"):
+            for u in users:
+                c1, c2, c3 = st.columns([2, 2, 1])
+                c1.write(f"**{u['username']}**")
+                c2.caption(f"가입일: {datetime.fromtimestamp(u['createdAt']).strftime('%Y-%m-%d')}")
+                c3.checkbox("추방", key=f"ban_sel_{u['username']}")
+            if st.form_submit_button("선택한 시민 추방"):
+                banned = [u['username'] for u in users if st.session_state.get(f"ban_sel_{u['username']}")]
+                if banned:
+                    commit({"op": "delete_users", "usernames": banned}, wait=True)
+                    shared.end_user_sessions(banned)
+                    st.success(f"{len(banned)}명 추방 완료")
+                    st.rerun()
 
         st.divider()
         st.write("#### 신규 시민 발급")
@@ -487,14 +709,240 @@ elif menu == "👑 대통령 집무실" and st.session_state.user == 'admin':
             nc_id = st.text_input("ID")
             nc_pw = st.text_input("PW")
             if st.form_submit_button("발급"):
-                if any(u['username'] == nc_id for u in users):
+                if store.get_user(nc_id):
                     st.error("이미 존재하는 ID")
+                elif bulk.reserved_username(nc_id):
+                    st.error("쓸 수 없는 ID")
                 elif nc_id and nc_pw:
-                    users.append({"username": nc_id, "password": nc_pw, "createdAt": datetime.now().timestamp()})
-                    save_data(data)
+                    commit({"op": "add_user", "user": {"username": nc_id, "password": nc_pw, "createdAt": datetime.now().timestamp()}}, wait=True)
                     st.success(f"{nc_id} 시민 발급 완료")
                     st.rerun()
 
+        st.write("#### 일괄 발급 (CSV)")
+        st.caption("한 줄에 `ID,PW` 형식. 첫 줄이 `username,password` 헤더여도 됩니다. `admin` 등 예약된 ID 는 건너뜁니다.")
+        with st.form("bulk_user_form"):
+            csv_file = st.file_uploader("시민 명부 CSV", type="csv")
+            if st.form_submit_button("일괄 발급") and csv_file:
+                now = datetime.now().timestamp()
+                new_users, skipped, seen = [], 0, set()
+                for row in csv.reader(io.StringIO(csv_file.getvalue().decode('utf-8-sig'))):
+                    if len(row) < 2 or row[0].strip().lower() == 'username':
+                        continue
+                    b_id, b_pw = row[0].strip(), row[1].strip()
+                    if not b_id or not b_pw or b_id in seen or bulk.reserved_username(b_id) or store.get_user(b_id):
+                        skipped += 1
+                        continue
+                    seen.add(b_id)
+                    new_users.append({"username": b_id, "password": b_pw, "createdAt": now})
+                if new_users:
+                    commit({"op": "add_users", "users": new_users}, wait=True)
+                st.success(f"{len(new_users)}명 발급 완료 (중복/오류 {skipped}건 제외)")
+
+    with admin_tab5:
+        citizens_tab()
+
+    @st.fragment
+    def images_tab():
+        st.subheader("국가 이미지 관리")
+        st.caption("업로드하거나 내려받은 이미지는 크기별로 변환되어 이 서버에서 직접 제공됩니다.")
+        if st.button("외부 이미지 모두 내려받기"):
+            with st.spinner("내려받는 중..."):
+                errors = fetch_all(data, IMAGE_DEFAULTS)
+            for slot, err in errors:
+                st.error(f"{IMAGE_SLOTS[slot][2]}: {err}")
+            if not errors:
+                st.success("모든 이미지를 로컬에 저장했습니다.")
+
+        for slot, (path, key, label) in IMAGE_SLOTS.items():
+            ref = slot_ref(data, slot, IMAGE_DEFAULTS.get(slot))
+            c1, c2 = st.columns([1, 3])
+            if ref:
+                c1.image(image_url(ref, 'thumb'), caption=label)
+            with c2.form(f"img_form_{slot}"):
+                upload = st.file_uploader(f"{label} 교체", type=["png", "jpg", "jpeg", "webp", "gif"])
+                if st.form_submit_button("교체") and upload:
+                    try:
+                        new_ref = store_image(upload.getvalue())
+                    except InvalidImageError as e:
+                        st.error(str(e))
+                    else:
+                        commit({"op": "update", "path": path, "values": {key: new_ref}}, wait=True)
+                        st.rerun()
+
+    with admin_tab6:
+        images_tab()
+
+    @st.fragment
+    def reports_tab():
+        st.subheader("신고 관리")
+        st.caption(f"신고가 {store.moderation.threshold}건 이상 쌓인 글은 자유 광장에서 자동으로 숨겨집니다.")
+        queue = store.most_reported(20)
+        if not queue:
+            st.info("접수된 신고가 없습니다.")
+        for post, count, hidden in queue:
+            with st.container(border=True):
+                c1, c2, c3 = st.columns([4, 1, 1])
+                c1.write(f"**{post['title']}** · {post['author']}")
+                c1.caption(f"신고 {count}건" + (" · 🙈 숨김" if hidden else ""))
+                if c2.button("삭제", key=f"mod_del_{post['id']}"):
+                    commit({"op": "delete_post", "id": post['id']}, wait=True)
+                    st.rerun()
+                if c3.button("기각", key=f"mod_dismiss_{post['id']}"):
+                    store.dismiss_reports(post['id'])
+                    st.rerun()
+                with st.expander("신고 내역"):
+                    for r in store.reports_for(post['id']):
+                        st.write(f"- {r['reporter']} · {r['reason']} · {datetime.fromtimestamp(r['timestamp']).strftime('%Y-%m-%d %H:%M')}")
+
+    with admin_tab7:
+        reports_tab()
+
+    @st.fragment
+    def metrics_tab():
+        st.subheader("성능 지표")
+        st.caption("이 서버 프로세스가 시작된 뒤 모든 세션의 누적값입니다. 시간은 밀리초(ms).")
+        st.button("새로고침", key="metrics_refresh")
+        counters, hists = metrics.snapshot()
+        total = lambda name: sum(v for (n, _), v in counters.items() if n == name)
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("재실행", f"{total('reruns_total'):,}")
+        m2.metric("기록 연산", f"{total('writes_total'):,}")
+        m3.metric("기록 용량", f"{total('bytes_written_total') / 1024:,.1f} KB")
+        m4.metric("접속 세션", metrics.active_sessions())
+
+        # 표는 markdown 으로 그린다 (st.dataframe 은 pandas 를 불러와 메모리를 크게 늘린다)
+        rows = ["| 구간 | 횟수 | 평균 | p50 ≤ | p90 ≤ | p99 ≤ |", "|---|---:|---:|---:|---:|---:|"]
+        for (name, labels), h in sorted(hists.items()):
+            label = name + "".join(f" [{v}]" for _, v in labels)
+            rows.append(f"| {label} | {h.count:,} | {h.sum / h.count:.1f} | "
+                        f"{h.quantile(0.5)} | {h.quantile(0.9)} | {h.quantile(0.99)} |")
+        st.markdown("\n".join(rows))
+
+        st.subheader("요청 제한")
+        action_names = {"post": "글 등록", "report": "신고", "login": "로그인 시도"}
+        rows = ["| 동작 | 제한 | 허용 | 차단 | 지금 막힌 사용자/세션 |", "|---|---|---:|---:|---|"]
+        for action, (capacity, rate), allowed_n, throttled_n, blocked in shared.rate_status():
+            shown = ", ".join(k if len(k) <= 20 else k[:8] + "…" for k in blocked[:10])
+            more = f" 외 {len(blocked) - 10}" if len(blocked) > 10 else ""
+            rows.append(f"| {action_names.get(action, action)} | {capacity:g}회 / {capacity / rate:g}초 | "
+                        f"{allowed_n:,} | {throttled_n:,} | {shown}{more} |")
+        st.markdown("\n".join(rows))
+
+        with st.expander("Prometheus 텍스트"):
+            text = metrics.prometheus()
+            st.download_button("내려받기", text, file_name="nation_metrics.prom", mime="text/plain")
+            st.code(text, language=None)
+
+    with admin_tab8:
+        metrics_tab()
+
+    # 게시글 / 시민 대량 내보내기. 파일은 내려받기 버튼을 누를 때 기록기와 별개의 스레드에서
+    # 저장소를 한 건씩 읽어 만든다 (bulk.py)
+    @st.fragment
+    def bulk_export_tab():
+        st.subheader("게시글 / 시민 내보내기")
+        e1, e2 = st.columns(2)
+        target = e1.selectbox("대상", ["게시글", "시민"], key="bulk_target")
+        fmt = e2.selectbox("형식", ["JSONL", "CSV"], key="bulk_format")
+        ext = fmt.lower()
+        if target == "게시글":
+            f1, f2 = st.columns(2)
+            cat_name = f1.selectbox("카테고리", ["전체", "자유", "신문고(청원)"], key="bulk_category")
+            category = {"전체": CATEGORY_ALL, "자유": "general", "신문고(청원)": "petition"}[cat_name]
+            since, until = date_bounds(f2.date_input("작성일 (비우면 전체)", value=(), key="bulk_dates"))
+
+            def build():
+                posts = store.iter_posts(category, since, until)
+                lines = bulk.jsonl_lines(posts) if ext == "jsonl" else bulk.csv_lines(posts, bulk.POST_FIELDS)
+                return bulk.spool(lines, f"posts_{ext}")
+            file_name = f"nation_posts.{ext}"
+        else:
+            st.caption("시민 파일에는 비밀번호가 들어 있습니다. 보관에 주의하세요.")
+
+            def build():
+                users = store.iter_users()
+                lines = bulk.jsonl_lines(users) if ext == "jsonl" else bulk.csv_lines(users, bulk.USER_FIELDS)
+                return bulk.spool(lines, f"users_{ext}")
+            file_name = f"nation_users.{ext}"
+        st.download_button(f"{file_name} 내려받기", build, file_name=file_name,
+                           mime="text/csv" if ext == "csv" else "application/x-ndjson", on_click="ignore")
+
+    @st.fragment
+    def bulk_import_tab():
+        st.subheader("게시글 / 시민 가져오기")
+        st.caption(f"JSONL 또는 CSV (내보내기와 같은 열). {bulk.IMPORT_CHUNK:,}건씩 검사해 반영하고, "
+                   "잘못된 줄과 이미 있는 게시글 id / 시민 ID 는 건너뜁니다.")
+        target = st.radio("대상", ["게시글", "시민"], horizontal=True, key="import_target")
+        upload = st.file_uploader("파일", type=["jsonl", "csv"], key="import_file")
+        if upload is None or not st.button("가져오기", key="import_run"):
+            return
+        fmt = "csv" if upload.name.lower().endswith(".csv") else "jsonl"
+        bar = st.progress(0.0, text="가져오는 중...")
+        size = max(1, upload.size)
+
+        def progress(result):
+            bar.progress(min(1.0, upload.tell() / size), text=f"{result.applied:,}건 반영")
+
+        if target == "게시글":
+            validate = bulk.validate_post
+            apply = lambda batch: store.import_posts(batch).result(timeout=COMMIT_TIMEOUT)
+        else:
+            validate = bulk.validate_user
+            apply = lambda batch: store.commit({"op": "add_users", "users": batch}).result(timeout=COMMIT_TIMEOUT)
+        try:
+            result = bulk.import_stream(upload, fmt, validate, apply, "posts" if target == "게시글" else "users",
+                                        progress=progress)
+        except Exception:
+            st.error("가져오는 중 저장에 실패했습니다. 반영된 묶음까지는 저장되어 있습니다.")
+            return
+        finally:
+            if target == "게시글":
+                store.finish_import()
+        bar.progress(1.0, text="완료")
+        reset_feed()
+        st.success(f"{result.applied:,}건 반영, 잘못된 줄 {result.invalid:,}건")
+        if result.errors:
+            st.markdown("\n".join(f"- {lineno}번째 줄: {reason}" for lineno, reason in result.errors))
+
+    @st.fragment
+    def data_tab():
+        st.subheader("데이터 내보내기")
+        st.caption("저장 파일은 공백 없는 형식으로 기록됩니다. 사람이 읽기 좋은 들여쓰기 JSON 은 여기서 따로 만듭니다.")
+        if st.button("내보내기 파일 만들기"):
+            with st.spinner("만드는 중..."):
+                st.session_state.export_json = jsonio.dumps_pretty(store.export())
+        if 'export_json' in st.session_state:
+            st.download_button(
+                f"nation_data.json 내려받기 ({len(st.session_state.export_json) / 1024:,.0f} KB)",
+                st.session_state.export_json, file_name="nation_data.json", mime="application/json",
+                on_click=lambda: st.session_state.pop('export_json', None),
+            )
+
+    # 날짜별 글 수는 저장소의 날짜별 집계(시간 색인, 보관 세그먼트 요약)에서 바로 읽는다
+    @st.fragment
+    def activity_tab():
+        st.subheader("📈 게시판 활동")
+        period = st.radio("기간", list(ACTIVITY_PERIODS), horizontal=True, key="activity_period")
+        days = ACTIVITY_PERIODS[period]
+        today = date.today()
+        start = today - timedelta(days=days - 1)
+
+        def build():
+            counts = store.post_days(start.isoformat())
+            rows = []
+            for i in range(days):
+                day = (start + timedelta(days=i)).isoformat()
+                rows.append((day, counts.get(day, {}).get('general', 0), counts.get(day, {}).get('petition', 0)))
+            return activity_chart_html(rows)
+
+        st.markdown(page_cache.get((store.part_version('posts'), today), ('activity', days), build), unsafe_allow_html=True)
+
+    with admin_tab9:
+        activity_tab()
+        data_tab()
+        bulk_export_tab()
+        bulk_import_tab()
+
 # --- [10] 마이 페이지 (시민) ---
 elif menu == "👤 마이 페이지" and st.session_state.user:
     u = st.session_state.user
@@ -515,11 +963,12 @@ elif menu == "👤 마이 페이지" and st.session_state.user:
         with st.form("pw_change"):
             new_pw = st.text_input("새 비밀번호", type="password")
             if st.form_submit_button("변경"):
-                for user in data['users']:
-                    if user['username'] == u['username']:
-                        user['password'] = new_pw
-                save_data(data)
+                commit({"op": "set_password", "username": u['username'], "password": new_pw}, wait=True)
                 st.success("변경되었습니다. 다시 로그인해주세요.")
-                st.session_state.user = None
+                shared.end_user_sessions([u['username']])
+                logout()
                 st.rerun()
 
+# 페이지 / 전체 재실행 시간 기록
+metrics.observe('page', (time.perf_counter() - page_started) * 1000, page=menu)
+metrics.observe('rerun', (time.perf_counter() - run_started) * 1000)
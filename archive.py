@@ -0,0 +1,548 @@
+import bisect
+import gzip
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from operator import itemgetter
+
+import jsonio
+from metrics import registry as metrics
+from search import post_weights, segment_postings
+from timeindex import add_days, count_days, day_of, normalize_timestamp
+
+# ==========================================
+# 오래된 게시글 보관 (hot / cold 계층)
+# ==========================================
+# 최신 글 NATION_HOT_POSTS 개(그리고 NATION_ARCHIVE_AGE_DAYS 일 이내의 글)만 스냅샷에 두고,
+# 나머지는 compaction 때 gzip 으로 압축한 JSONL 세그먼트로 옮긴다.
+#   nation_archive/seg-000001.jsonl.gz : 세그먼트. 한 번 쓰면 바뀌지 않는다 (최신 글이 앞)
+#   nation_archive/seg-000001.grams.gz : 그 세그먼트의 검색 토큰 -> 글 위치 목록 (search.segment_postings)
+#   nation_archive/index.json          : 세그먼트 목록과 세그먼트별 요약, 삭제 표시
+# 세그먼트 요약(글 수, id 범위, 시간 범위, 카테고리별 / 날짜별 글 수)만 보고 건너뛸 세그먼트를 고르고,
+# 자유 광장에서 최신 글을 다 넘겨 본 사용자에게만 세그먼트를 풀어 보여준다.
+# 검색은 세그먼트별 토큰 목록을 처음 한 번 합쳐 (글마다 id / 시각 / 카테고리와 함께) 메모리에 두고,
+# 점수로 상위에 든 글만 세그먼트에서 꺼낸다.
+# 합친 목록은 세그먼트가 추가 / 교체되거나 삭제 표시가 생기면 그 부분만 고친다 (_sync_merged).
+# 보관된 글의 삭제는 색인의 삭제 표시로, 신고는 게시글 id 기준인 ReportStore 로 처리한다.
+# 삭제 표시에는 글의 날짜와 카테고리를 함께 적어, 날짜별 글 수를 세그먼트를 풀지 않고 낸다.
+#
+# 관리자 가져오기로 들어온 오래된 글(watermark 이전)은 스냅샷을 거치지 않고 바로 세그먼트가 된다.
+# 이런 세그먼트는 시간 범위가 다른 세그먼트와 겹칠 수 있으므로 읽을 때 정렬 키로 합치고,
+# 가져오기가 끝나면 consolidate() 로 겹치는 세그먼트들을 겹치지 않게 다시 쓴다.
+#
+# watermark 는 보관된 글 중 가장 최신 글의 정렬 키다. 스냅샷의 글은 모두 이보다 최신이어야
+# 하므로, 세그먼트를 쓴 뒤 스냅샷을 바꾸기 전에 멈췄다면 다시 읽을 때 중복을 걸러낸다.
+
+ARCHIVE_DIR = 'nation_archive'
+INDEX_FILE = 'index.json'
+HOT_POSTS = int(os.environ.get('NATION_HOT_POSTS', '5000'))
+ARCHIVE_AGE_DAYS = float(os.environ.get('NATION_ARCHIVE_AGE_DAYS', '0'))  # 0 이면 나이 기준 없음
+# 보관할 글이 이만큼 쌓여야 세그먼트를 만든다 (작은 세그먼트가 잔뜩 생기지 않게)
+SEGMENT_MIN = 500
+SEGMENT_MAX = 5000
+# 풀어 둔 세그먼트를 몇 개까지 메모리에 둘지
+CACHED_SEGMENTS = 4
+
+
+class Archive:
+    def __init__(self, key, directory=ARCHIVE_DIR, hot_posts=HOT_POSTS, age_days=ARCHIVE_AGE_DAYS):
+        # key(post) 는 피드 정렬 키 (storage.post_cursor)
+        self.key = key
+        self.directory = directory
+        self.hot_posts = hot_posts
+        self.age_days = age_days
+        self._lock = threading.Lock()
+        self._segments = OrderedDict()  # 세그먼트 이름 -> 글 목록 (LRU)
+        # 보관된 글 전체의 검색 토큰 목록: 토큰 -> (글 번호 배열, 가중 빈도 배열).
+        # 글 번호는 세그먼트마다 받은 시작 번호 + 세그먼트 안 위치이므로 배열은 늘 오름차순이다
+        self._merged = None
+        self._bases = []  # [(시작 번호, 끝 번호, 세그먼트 이름, (글 id, 시각, 카테고리 목록))] 시작 번호 순
+        self._next_base = 0
+        self._merged_deleted = set()  # 합친 목록에서 이미 뺀 삭제 표시
+        self._merged_lock = threading.Lock()
+        self._index_sig = None
+        self._ids = None  # 가져오기 중복 확인용 id 집합 (처음 필요할 때 만든다)
+        self.segments = []
+        self._load_index()
+
+    # --- 색인 ---
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _signature(self):
+        try:
+            st = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load_index(self):
+        self._index_sig = self._signature()
+        if self._index_sig is None:
+            index = {}
+        else:
+            with open(self._index_path(), 'rb') as f:
+                index = jsonio.loads(f.read())
+        segments = index.get('segments', [])  # 오래된 세그먼트부터
+        if [seg['name'] for seg in segments] != [seg['name'] for seg in self.segments]:
+            self._ids = None
+        self.segments = segments
+        self.watermark = tuple(index['watermark']) if index.get('watermark') else None
+        # 게시글 id -> [날짜, 카테고리]. 예전 색인은 id 목록이었다 (migrate 가 채운다)
+        deleted = index.get('deleted', {})
+        self.deleted = dict.fromkeys(deleted) if isinstance(deleted, list) else deleted
+
+    def _write_index(self):
+        index = {"segments": self.segments, "watermark": self.watermark, "deleted": self.deleted}
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(jsonio.dumps(index))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._index_path())
+        self._index_sig = self._signature()
+
+    def refresh(self):
+        # 다른 프로세스가 색인을 바꿨으면 다시 읽고 True
+        if self._signature() == self._index_sig:
+            return False
+        with self._lock:
+            self._load_index()
+        return True
+
+    def count(self):
+        return sum(seg['count'] for seg in self.segments) - len(self.deleted)
+
+    def day_counts(self):
+        # 날짜 -> {카테고리: 글 수} (삭제 표시된 글 제외)
+        days = {}
+        for seg in self.segments:
+            add_days(days, seg.get('days', {}))
+        for entry in self.deleted.values():
+            if entry is not None:
+                add_days(days, {entry[0]: {entry[1]: 1}}, -1)
+        return days
+
+    # --- 보관 (호출하는 쪽이 배타적 파일 잠금을 잡고 있어야 한다) ---
+
+    def split_cold(self, posts):
+        # (남길 글, 보관할 글). posts 는 최신 글이 앞. 보관할 글이 SEGMENT_MIN 보다 적으면 보관하지 않는다.
+        cut = len(posts)
+        if len(posts) > self.hot_posts:
+            cut = self.hot_posts
+        if self.age_days:
+            cutoff = time.time() - self.age_days * 86400
+            while cut > 0 and self.key(posts[cut - 1])[0] < cutoff:
+                cut -= 1
+        if len(posts) - cut < SEGMENT_MIN:
+            return posts, []
+        return posts[:cut], posts[cut:]
+
+    def append(self, cold):
+        # cold 는 최신 글이 앞. 오래된 쪽부터 SEGMENT_MAX 개씩 세그먼트로 쓴 뒤 색인을 바꾼다.
+        self._load_index()
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments.extend(self._write_chunks(cold))
+        newest = self.key(cold[0])
+        if self.watermark is None or newest > self.watermark:
+            self.watermark = newest
+        self._write_index()
+        metrics.inc('archived_posts_total', len(cold))
+
+    def _write_chunks(self, posts):
+        # posts(최신 글이 앞)를 오래된 쪽부터 SEGMENT_MAX 개씩 새 세그먼트로 쓰고 요약 목록을 돌려준다
+        # 번호는 디렉터리의 파일로 정한다 (한 번에 여러 묶음을 다시 쓸 때 색인에는 아직 없다)
+        seq = max((int(f[4:10]) for f in os.listdir(self.directory) if f.startswith('seg-')), default=0)
+        written = []
+        for end in range(len(posts), 0, -SEGMENT_MAX):
+            chunk = posts[max(0, end - SEGMENT_MAX):end]
+            seq += 1
+            name = f'seg-{seq:06d}.jsonl.gz'
+            self._write_segment(name, chunk)
+            postings = self._write_postings(name, chunk)
+            ids = [p['id'] for p in chunk]
+            if self._ids is not None:
+                self._ids.update(ids)
+            written.append({
+                "name": name,
+                "count": len(chunk),
+                "id_min": min(ids),
+                "id_max": max(ids),
+                "newest": list(self.key(chunk[0])),
+                "oldest": list(self.key(chunk[-1])),
+                "categories": dict(Counter(p['category'] for p in chunk)),
+                "days": count_days(chunk),
+                "postings": postings,
+            })
+        return written
+
+    def consolidate(self):
+        # 시간 범위가 겹치는 세그먼트 묶음을 합쳐 겹치지 않는 세그먼트로 다시 쓴다.
+        # 가져오기가 끝난 뒤 한 번 부른다. 삭제 표시된 글은 이때 버린다. 다시 쓴 세그먼트 수를 돌려준다
+        self._load_index()
+        groups = []
+        for seg in sorted(self.segments, key=lambda seg: tuple(seg['oldest'])):
+            if groups and tuple(seg['oldest']) <= groups[-1][1]:
+                groups[-1][0].append(seg)
+                groups[-1][1] = max(groups[-1][1], tuple(seg['newest']))
+            else:
+                groups.append([[seg], tuple(seg['newest'])])
+        merged = [group for group, _ in groups if len(group) > 1]
+        if not merged:
+            return 0
+        replaced = set()
+        written = []
+        for group in merged:
+            posts = list(self._merge(group))
+            replaced.update(seg['name'] for seg in group)
+            if posts:
+                written.extend(self._write_chunks(posts))
+        segments = [seg for seg in self.segments if seg['name'] not in replaced] + written
+        segments.sort(key=lambda seg: tuple(seg['oldest']))
+        self.segments = segments
+        # 버린 글의 삭제 표시는 더 필요 없다
+        self._ids = None
+        ids = self.ids()
+        self.deleted = {post_id: entry for post_id, entry in self.deleted.items() if post_id in ids}
+        self._write_index()
+        self._drop_segments(replaced)
+        metrics.inc('archive_consolidated_total', len(replaced))
+        return len(replaced)
+
+    def _drop_segments(self, names):
+        # 색인에서 빠진 세그먼트 파일과 그 토큰 목록 파일을 지운다
+        with self._lock:
+            for name in names:
+                self._segments.pop(name, None)
+        for name in names:
+            for f in (name, _postings_name(name)):
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except FileNotFoundError:
+                    pass
+
+    def import_posts(self, posts):
+        # 가져온 오래된 글을 세그먼트로 쓴다. 이미 보관된 글은 건너뛴다. 새로 쓴 글 수를 돌려준다
+        self._load_index()
+        known = self.ids()
+        new = {}
+        for post in posts:
+            if post['id'] not in known:
+                new[post['id']] = post
+        if not new:
+            return 0
+        self.append(sorted(new.values(), key=self.key, reverse=True))
+        return len(new)
+
+    def ids(self):
+        # 보관된 모든 글의 id (삭제 표시 포함). 세그먼트를 캐시하지 않고 한 번씩 읽는다
+        if self._ids is None:
+            ids = set()
+            for seg in self.segments:
+                with gzip.open(os.path.join(self.directory, seg['name']), 'rb') as f:
+                    ids.update(jsonio.loads(line)['id'] for line in f if line.strip())
+            self._ids = ids
+        return self._ids
+
+    def _write_segment(self, name, posts):
+        path = os.path.join(self.directory, name)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                for post in posts:
+                    f.write(jsonio.dumps(post) + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+
+    def _write_postings(self, name, posts):
+        # 세그먼트와 같은 순서의 글 목록으로 토큰 목록 파일을 쓰고 그 이름을 돌려준다
+        postings = _postings_name(name)
+        path = os.path.join(self.directory, postings)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(jsonio.dumps(segment_postings(posts)))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+        return postings
+
+    def delete(self, post_id):
+        # 보관된 글 삭제 표시. 있던 글이면 True
+        self._load_index()
+        post = None if post_id in self.deleted else self.find(post_id)
+        if post is None:
+            return False
+        self.deleted[post_id] = [day_of(post['timestamp']), post['category']]
+        self._write_index()
+        return True
+
+    def needs_migration(self):
+        return (any('days' not in seg or 'postings' not in seg for seg in self.segments)
+                or any(entry is None for entry in self.deleted.values()))
+
+    def migrate(self):
+        # 한 번만: 밀리초 시각을 초로 바꾸고(그런 글이 있는 세그먼트만 새로 쓴다),
+        # 세그먼트 날짜별 요약, 검색 토큰 목록, 삭제 표시의 날짜를 채운다
+        self._load_index()
+        if not self.needs_migration():
+            return
+        segments, replaced = [], []
+        for seg in self.segments:
+            with gzip.open(os.path.join(self.directory, seg['name']), 'rb') as f:
+                posts = [jsonio.loads(line) for line in f if line.strip()]
+            changed = False
+            for post in posts:
+                ts = normalize_timestamp(post['timestamp'])
+                if ts != post['timestamp']:
+                    post['timestamp'] = ts
+                    changed = True
+                if post['id'] in self.deleted and self.deleted[post['id']] is None:
+                    self.deleted[post['id']] = [day_of(ts), post['category']]
+            if changed:
+                posts.sort(key=self.key, reverse=True)
+                segments.extend(self._write_chunks(posts))
+                replaced.append(seg['name'])
+            else:
+                seg['days'] = count_days(posts)
+                if 'postings' not in seg:
+                    seg['postings'] = self._write_postings(seg['name'], posts)
+                segments.append(seg)
+        segments.sort(key=lambda seg: tuple(seg['oldest']))
+        self.segments = segments
+        # 세그먼트에서 찾지 못한 삭제 표시는 지운다
+        self.deleted = {post_id: entry for post_id, entry in self.deleted.items() if entry is not None}
+        self._write_index()
+        self._drop_segments(replaced)
+
+    # --- 읽기 ---
+
+    def _cached(self, cache, name, read):
+        # 풀어 둔 파일 내용을 cache(LRU)에 CACHED_SEGMENTS 개까지 둔다
+        with self._lock:
+            value = cache.get(name)
+            if value is not None:
+                cache.move_to_end(name)
+                return value
+        value = read()
+        with self._lock:
+            cache[name] = value
+            while len(cache) > CACHED_SEGMENTS:
+                cache.popitem(last=False)
+        return value
+
+    def _read_segment(self, name):
+        def read():
+            with metrics.timer('archive_read'):
+                with gzip.open(os.path.join(self.directory, name), 'rb') as f:
+                    return [jsonio.loads(line) for line in f if line.strip()]
+        return self._cached(self._segments, name, read)
+
+    def _read_postings(self, name):
+        with metrics.timer('archive_read', kind='postings'):
+            with gzip.open(os.path.join(self.directory, name), 'rb') as f:
+                return jsonio.loads(f.read())
+
+    # --- 검색 (합친 토큰 목록. _merged_lock 을 잡고 고친다) ---
+
+    def _sync_merged(self):
+        # 합친 토큰 목록을 지금 세그먼트 목록과 삭제 표시에 맞춘다. 처음에는 모든 세그먼트를 읽는다
+        if self._merged is None:
+            self._merged = {}
+        segments = list(self.segments)
+        names = {seg['name'] for seg in segments}
+        gone = [entry for entry in self._bases if entry[2] not in names]
+        if gone:
+            self._unmerge_segments(gone)
+        merged = {entry[2] for entry in self._bases}
+        for seg in segments:
+            if seg['name'] not in merged and 'postings' in seg:
+                self._merge_segment(seg)
+        deleted = set(self.deleted)
+        for post_id in deleted - self._merged_deleted:
+            self._unmerge_post(post_id)
+        # 세그먼트를 다시 쓰며 함께 버려진 삭제 표시는 잊는다
+        self._merged_deleted = deleted
+
+    def _merge_segment(self, seg):
+        # 토큰 목록과 함께 글마다 (id, 시각, 카테고리)를 둔다. 순위는 글을 풀지 않고 매긴다
+        base = self._next_base
+        self._next_base += seg['count']
+        for token, entries in self._read_postings(seg['postings']).items():
+            lists = self._merged.get(token)
+            if lists is None:
+                lists = self._merged[token] = (array('I'), array('I'))
+            lists[0].extend(base + i for i in entries[::2])
+            lists[1].extend(entries[1::2])
+        posts = self._read_segment(seg['name'])
+        meta = ([p['id'] for p in posts], array('d', (p['timestamp'] for p in posts)),
+                [sys.intern(p['category']) for p in posts])
+        self._bases.append((base, base + seg['count'], seg['name'], meta))
+
+    def _unmerge_segments(self, gone):
+        # 빠진 세그먼트의 글 번호 구간을 모든 토큰에서 잘라낸다 (가져오기 뒤 consolidate 때만 생긴다)
+        for token in list(self._merged):
+            docs, weights = self._merged[token]
+            for start, end, _, _ in gone:
+                lo, hi = bisect.bisect_left(docs, start), bisect.bisect_left(docs, end)
+                if lo < hi:
+                    del docs[lo:hi]
+                    del weights[lo:hi]
+            if not docs:
+                del self._merged[token]
+        self._bases = [entry for entry in self._bases if entry not in gone]
+
+    def _unmerge_post(self, post_id):
+        # 삭제 표시된 글을 그 글의 토큰에서만 뺀다
+        for start, _, name, (ids, _, _) in self._bases:
+            if post_id not in ids:
+                continue
+            i = ids.index(post_id)
+            for token in post_weights(self._read_segment(name)[i]):
+                lists = self._merged.get(token)
+                if lists is None:
+                    continue
+                docs, weights = lists
+                at = bisect.bisect_left(docs, start + i)
+                if at < len(docs) and docs[at] == start + i:
+                    del docs[at]
+                    del weights[at]
+                if not docs:
+                    del self._merged[token]
+            return
+
+    def search(self, tokens, category=None):
+        # 검색어 토큰을 모두 가진 보관 글 [(id, 시각, [토큰별 가중 빈도], 위치)], 토큰별 글 수, 보관된 글 수.
+        # search.rank 가 점수를 매기고, 상위에 든 글만 load(위치 목록) 로 세그먼트에서 꺼낸다
+        with self._merged_lock:
+            self._sync_merged()
+            lists = [self._merged.get(t) for t in tokens]
+            doc_counts = [len(lists_[0]) if lists_ else 0 for lists_ in lists]
+            found = []
+            if all(lists):
+                # 가장 짧은 목록의 글 번호를 세그먼트별로 훑으며 나머지 목록에서 이진 탐색으로 확인한다
+                first = min(range(len(lists)), key=lambda k: len(lists[k][0]))
+                first_docs, first_weights = lists[first]
+                for base, end, name, (ids, times, cats) in self._bases:
+                    for at in range(bisect.bisect_left(first_docs, base), bisect.bisect_left(first_docs, end)):
+                        doc = first_docs[at]
+                        i = doc - base
+                        if category is not None and cats[i] != category:
+                            continue
+                        weights = []
+                        for k, (docs, doc_weights) in enumerate(lists):
+                            if k == first:
+                                weights.append(first_weights[at])
+                                continue
+                            j = bisect.bisect_left(docs, doc)
+                            if j == len(docs) or docs[j] != doc:
+                                break
+                            weights.append(doc_weights[j])
+                        else:
+                            found.append((ids[i], times[i], weights, (name, i)))
+            total = self.count()
+        return found, doc_counts, total
+
+    def load(self, refs):
+        # search 가 준 위치 목록의 글. 풀어 둔 세그먼트가 아니면 한 번 풀어 필요한 줄만 읽는다.
+        # 그 사이 consolidate 로 교체된 세그먼트의 글은 None
+        wanted = {}
+        for name, i in refs:
+            wanted.setdefault(name, set()).add(i)
+        posts = {}
+        for name, positions in wanted.items():
+            with self._lock:
+                cached = self._segments.get(name)
+            if cached is not None:
+                posts.update(((name, i), cached[i]) for i in positions)
+                continue
+            try:
+                with metrics.timer('archive_read', kind='lines'):
+                    with gzip.open(os.path.join(self.directory, name), 'rb') as f:
+                        lines = f.read().split(b'\n')
+            except FileNotFoundError:
+                continue
+            posts.update(((name, i), jsonio.loads(lines[i])) for i in positions)
+        return [posts.get(ref) for ref in refs]
+
+    def _segment_posts(self, seg, category, cursor):
+        for post in self._read_segment(seg['name']):
+            if post['id'] in self.deleted:
+                continue
+            if category is not None and post['category'] != category:
+                continue
+            if cursor is not None and self.key(post) >= cursor:
+                continue
+            yield post
+
+    def iter_posts(self, category=None, cursor=None):
+        # 최신 글부터. cursor 가 있으면 그보다 오래된 글만.
+        # 세그먼트는 가장 최신 글 순으로 보되, 다음에 내보낼 글보다 최신 글을 가질 수 있는
+        # 세그먼트만 그때 풀어 합류시킨다 (겹치지 않으면 한 번에 하나씩 푼다).
+        segs = [seg for seg in self.segments
+                if (cursor is None or tuple(seg['oldest']) < cursor)
+                and (category is None or seg['categories'].get(category))]
+        return self._merge(segs, category, cursor)
+
+    def _merge(self, segs, category=None, cursor=None):
+        segs = sorted(segs, key=lambda seg: tuple(seg['newest']), reverse=True)
+        heap = []
+        order = itertools.count()  # 같은 키의 비교가 글 dict 까지 가지 않게
+        pending = iter(segs)
+        seg = next(pending, None)
+        while True:
+            while seg is not None and (not heap or tuple(seg['newest']) >= _newest(heap)):
+                posts = self._segment_posts(seg, category, cursor)
+                _push(heap, posts, order, self.key)
+                seg = next(pending, None)
+            if not heap:
+                return
+            _, _, post, posts = heapq.heappop(heap)
+            yield post
+            _push(heap, posts, order, self.key)
+
+    def find(self, post_id):
+        for seg in reversed(self.segments):
+            if not seg['id_min'] <= post_id <= seg['id_max']:
+                continue
+            for post in self._read_segment(seg['name']):
+                if post['id'] == post_id:
+                    return None if post_id in self.deleted else post
+        return None
+
+
+def _postings_name(name):
+    return name.replace('.jsonl.gz', '.grams.gz')
+
+
+# iter_posts 의 합치기 힙은 최소 힙이므로 정렬 키를 뒤집어 넣는다
+
+
+class _Desc:
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _push(heap, posts, order, key):
+    post = next(posts, None)
+    if post is not None:
+        heapq.heappush(heap, (_Desc(key(post)), next(order), post, posts))
+
+
+def _newest(heap):
+    return heap[0][0].key
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import urllib.request
+
+from PIL import Image
+
+from shared import state as shared
+
+# ==========================================
+# 이미지 자산 캐시
+# ==========================================
+# 국기/국장/문화 이미지는 외부 URL 이라 매 페이지마다 브라우저가 외부 CDN 에서 받아온다.
+# 여기서는 원본을 한 번 내려받거나(또는 관리자가 업로드) 내용 해시로 이름 붙인
+# 크기별 변형(thumb/card/full)을 static/assets 에 저장하고 Streamlit 정적 경로로 내보낸다.
+#
+# 데이터에는 원래 URL 또는 'asset:<해시>.<확장자>' 참조가 들어간다.
+# 파일 이름이 내용 해시이므로 같은 URL 은 내용이 바뀌지 않는다. 긴 Cache-Control
+# (immutable) 헤더는 앞단 프록시에서 /app/static/assets/ 경로에 붙인다.
+#
+# 원본 URL -> 참조 목록(manifest)은 프로세스마다 메모리에 두므로, 목록을 저장하면 공유 상태의
+# 'assets' 채널에 알리고 다른 복제본은 다음 재실행에서 목록을 다시 읽는다 (shared.py).
+
+ASSET_DIR = os.path.join('static', 'assets')
+ASSET_URL = '/app/static/assets'
+MANIFEST_FILE = os.path.join(ASSET_DIR, 'manifest.json')
+ASSET_PREFIX = 'asset:'
+FETCH_TIMEOUT = 10
+
+# 변형별 최대 가로 크기 (원본보다 키우지는 않는다)
+VARIANTS = {'thumb': 160, 'card': 480, 'full': 1600}
+
+# 관리자가 교체할 수 있는 이미지 자리: 이름 -> (데이터 경로, 키, 설명)
+IMAGE_SLOTS = {
+    'flag': (['stats'], 'flag', '국기'),
+    'coatOfArms': (['stats'], 'coatOfArms', '국장'),
+    'culture': (['details', 'culture'], 'image', '문화/홍보 대표 이미지'),
+}
+
+
+
+class InvalidImageError(ValueError):
+    # 업로드 / 내려받은 파일을 이미지로 읽을 수 없을 때
+    pass
+
+
+_lock = threading.Lock()
+_fetching = set()
+_failed = set()
+
+
+def _load_manifest():
+    # 원본 URL -> 'asset:...' 참조
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+_manifest = _load_manifest()
+
+
+def _save_manifest():
+    # 다른 복제본이 그 사이 저장한 항목을 잃지 않도록 파일의 목록과 합쳐 쓴다
+    _manifest.update({url: ref for url, ref in _load_manifest().items() if url not in _manifest})
+    tmp = MANIFEST_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_manifest, f, ensure_ascii=False)
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def reload_manifest():
+    global _manifest
+    manifest = _load_manifest()
+    with _lock:
+        _manifest = manifest
+        _failed.clear()
+
+
+shared.subscribe('assets', reload_manifest)
+
+
+def store_image(raw):
+    # 원본 바이트에서 변형들을 만들어 저장하고 'asset:<해시>.<확장자>' 참조를 돌려준다
+    digest = hashlib.sha256(raw).hexdigest()[:16]
+    try:
+        img = Image.open(io.BytesIO(raw))
+        has_alpha = img.mode in ('RGBA', 'LA', 'P')
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    except Image.UnidentifiedImageError as e:
+        raise InvalidImageError('이미지 형식을 알 수 없는 파일입니다.') from e
+    except (OSError, Image.DecompressionBombError) as e:
+        # 잘린 파일 등 디코딩 오류
+        raise InvalidImageError(f'이미지 파일을 읽을 수 없습니다: {e}') from e
+    ext, fmt = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    for variant, width in VARIANTS.items():
+        path = os.path.join(ASSET_DIR, f'{digest}-{variant}.{ext}')
+        if os.path.exists(path):
+            continue
+        resized = img.copy()
+        if resized.width > width:
+            resized = resized.resize((width, round(resized.height * width / resized.width)), Image.LANCZOS)
+        tmp = path + '.tmp'
+        resized.save(tmp, fmt, quality=85, optimize=True)
+        os.replace(tmp, path)
+    return f'{ASSET_PREFIX}{digest}.{ext}'
+
+
+def fetch(url):
+    # 외부 URL 을 내려받아 저장한다. 이미 받은 URL 이면 기존 참조를 돌려준다.
+    if url in _manifest:
+        return _manifest[url]
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as resp:
+        raw = resp.read()
+    ref = store_image(raw)
+    with _lock:
+        _manifest[url] = ref
+        _save_manifest()
+    shared.publish('assets')
+    return ref
+
+
+def _fetch_in_background(url):
+    try:
+        fetch(url)
+    except Exception:
+        # 실패한 URL 은 이 프로세스에서 다시 시도하지 않는다 (관리자 명령으로 재시도)
+        with _lock:
+            _failed.add(url)
+    finally:
+        with _lock:
+            _fetching.discard(url)
+
+
+def image_url(ref, variant='card'):
+    # 화면에 쓸 주소. 아직 로컬에 없는 외부 이미지는 원래 URL 을 쓰고 백그라운드에서 받아 둔다.
+    if not ref.startswith(ASSET_PREFIX):
+        local = _manifest.get(ref)
+        if local is None:
+            with _lock:
+                start = ref not in _fetching and ref not in _failed
+                if start:
+                    _fetching.add(ref)
+            if start:
+                threading.Thread(target=_fetch_in_background, args=(ref,), daemon=True).start()
+            return ref
+        ref = local
+    digest, ext = ref[len(ASSET_PREFIX):].split('.')
+    return f'{ASSET_URL}/{digest}-{variant}.{ext}'
+
+
+def slot_ref(data, slot, default=None):
+    path, key, _ = IMAGE_SLOTS[slot]
+    target = data
+    for k in path:
+        target = target[k]
+    return target.get(key, default)
+
+
+def fetch_all(data, defaults=None):
+    # 관리자 명령: 데이터가 가리키는 외부 이미지를 모두 지금 내려받는다. (자리, 오류) 목록을 돌려준다.
+    # defaults 는 데이터에 값이 없는 자리에 화면이 대신 쓰는 이미지 {자리: URL}
+    errors = []
+    defaults = defaults or {}
+    for slot in IMAGE_SLOTS:
+        ref = slot_ref(data, slot, defaults.get(slot))
+        if not ref or ref.startswith(ASSET_PREFIX):
+            continue
+        try:
+            fetch(ref)
+            with _lock:
+                _failed.discard(ref)
+        except Exception as e:
+            errors.append((slot, str(e)))
+    return errors
@@ -0,0 +1,76 @@
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+
+# ==========================================
+# 벤치마크용 가상 국가 데이터 생성기
+# ==========================================
+# 실제 nation_data.json 의 stats / details 는 그대로 두고 게시글과 시민만
+# 지정한 규모로 채운다. 같은 seed 면 항상 같은 파일이 나온다.
+#   python bench/generate.py 10k -o /tmp/nation_10k.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+PASSWORD = 'pw'
+
+_WORDS = ['국방', '예산', '청원', '복지', '교육', '세금', '철도', '항만', '연방', '의회', '선거', '문화',
+          '축제', '도로', '병원', '주택', '환경', '에너지', '과학', '우주', '농업', '어업', '관광', '치안',
+          '개혁', '요구', '찬성', '반대', '제안', '건의', '시민', '정부', '대통령', '장관', '지역', '미래']
+_START = 1709251200  # 2024-03-01
+
+
+def username(i):
+    return f'citizen{i:06d}'
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(_WORDS) for _ in range(n))
+
+
+def generate(n_posts, n_users=None, seed=0, base_file=os.path.join(ROOT, 'nation_data.json')):
+    rng = random.Random(seed)
+    n_users = n_posts if n_users is None else n_users
+    with open(base_file, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    data = {"stats": copy.deepcopy(base['stats']), "details": copy.deepcopy(base['details'])}
+    data['users'] = [
+        {"username": username(i), "password": PASSWORD, "createdAt": _START + rng.randrange(86400 * 365)}
+        for i in range(n_users)
+    ]
+    # 글은 최신 글이 앞에 오도록 저장한다 (앱의 저장 순서와 같다)
+    ts = _START + 86400 * 365
+    posts = []
+    for i in range(n_posts):
+        ts -= rng.randrange(1, 600)
+        posts.append({
+            "id": f'bench-{i}',
+            "author": username(rng.randrange(n_users)) if n_users else '대통령실',
+            "title": _sentence(rng, rng.randint(2, 5)),
+            "content": _sentence(rng, rng.randint(8, 40)),
+            "timestamp": ts,
+            "category": 'petition' if rng.random() < 0.2 else 'general',
+        })
+    data['posts'] = posts
+    return data
+
+
+def write(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='벤치마크용 nation_data.json 생성')
+    parser.add_argument('size', choices=SIZES, help='게시글/시민 수')
+    parser.add_argument('-o', '--output', default='nation_data.json')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write(generate(SIZES[args.size], seed=args.seed), args.output)
+    print(f'{args.output}: {SIZES[args.size]:,} posts / users')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate import ROOT, SIZES, PASSWORD, generate, username, write
+
+# ==========================================
+# 부하 / 성능 벤치마크
+# ==========================================
+# 규모별 가상 국가 데이터로 app.py 를 streamlit AppTest 로 돌리며 잰다.
+#   - 재실행(rerun) 지연 시간: 동작별 p50 / p90 / p99 / 최대
+#   - save_data 소요 시간과 스냅샷 크기, 시나리오 동안 기록된 저널/DB 크기
+#   - 최대 RSS (규모마다 별도 프로세스에서 측정)
+#
+#   python bench/run.py                      # 1k, 10k 측정 후 결과 표 출력
+#   python bench/run.py --sizes 100k         # 규모 지정
+#   python bench/run.py --compare            # bench/baseline.json 과 비교 (회귀 시 종료 코드 1)
+#   python bench/run.py --save-baseline      # 현재 결과를 기준값으로 저장
+#
+# 저장 백엔드는 NATION_STORAGE 환경 변수를 그대로 따른다.
+# 데이터 이관은 측정 전에 따로 끝내므로 cold_start 는 이관이 끝난 서버의 재시작 시간이다.
+# 기준값은 측정한 기계에 따라 달라지므로 같은 기계에서 비교한다.
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+ADMIN_CODE = 'admin123'
+DEFAULT_TOLERANCE = 1.5
+# 이보다 작은 지연 시간 차이는 측정 잡음으로 보고 회귀로 치지 않는다
+LATENCY_FLOOR_MS = 5
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples):
+    return {
+        "n": len(samples),
+        "p50": round(_percentile(samples, 0.50), 2),
+        "p90": round(_percentile(samples, 0.90), 2),
+        "p99": round(_percentile(samples, 0.99), 2),
+        "max": round(max(samples), 2),
+    }
+
+
+# --- 세션 시나리오 (작업 프로세스 안에서 실행) ---
+
+class Driver:
+    def __init__(self, workdir, timeout):
+        from streamlit.testing.v1 import AppTest
+        self._app_test = AppTest
+        self.app = os.path.join(workdir, 'app.py')
+        self.timeout = timeout
+        self.samples = {}
+
+    def timed(self, label, run):
+        start = time.perf_counter()
+        at = run()
+        self.samples.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(f'{label}: {at.exception}')
+        return at
+
+    def session(self):
+        return self.timed('open', lambda: self._app_test.from_file(self.app, default_timeout=self.timeout).run())
+
+    @staticmethod
+    def button(at, label=None, key=None):
+        return next(b for b in at.button if (label is None or b.label == label) and (key is None or b.key == key))
+
+    def visit_menus(self, at):
+        radio = at.sidebar.radio[0]
+        for option in radio.options:
+            at = self.timed('menu', lambda: radio.set_value(option).run())
+            radio = at.sidebar.radio[0]
+        return at
+
+    def citizen(self, i):
+        at = self.session()
+        at.text_input(key='cid').input(username(i))
+        at.text_input(key='cpw').input(PASSWORD)
+        at = self.timed('login', lambda: self.button(at, '시민 접속').click().run())
+        at = self.visit_menus(at)
+        at = self.timed('menu', lambda: at.sidebar.radio[0].set_value('자유 광장').run())
+
+        next(t for t in at.text_input if t.label == '제목').input(f'벤치마크 글 {i}')
+        next(t for t in at.text_area if t.label == '내용').input('부하 측정용 게시글입니다')
+        at = self.timed('post', lambda: self.button(at, '등록').click().run())
+
+        report = next(b for b in at.button if b.key and b.key.startswith('rep_'))
+        at = self.timed('report', lambda: report.click().run())
+
+        next(t for t in at.text_input if t.label == '🔎 게시글 검색').input('국방 예산')
+        at = self.timed('search', lambda: at.run())
+
+        next(t for t in at.text_input if t.label == '🔎 게시글 검색').input('')
+        at = self.timed('menu', lambda: at.run())
+        nxt = [b for b in at.button if b.label == '다음 ▶']
+        if nxt:
+            self.timed('feed_page', lambda: nxt[0].click().run())
+
+    def admin(self, i):
+        at = self.session()
+        at.text_input(key='apw').input(ADMIN_CODE)
+        at = self.timed('login', lambda: self.button(at, '집무실 입장').click().run())
+        at = self.timed('menu', lambda: at.sidebar.radio[0].set_value('👑 대통령 집무실').run())
+
+        at.slider[0].set_value((i * 7) % 100)
+        at = self.timed('admin_edit', lambda: self.button(at, '국방 데이터 갱신').click().run())
+        at = self.timed('admin_edit', lambda: self.button(at, '경제 지표 저장').click().run())
+
+        roster_q = next(t for t in at.text_input if t.key == 'roster_q')
+        self.timed('admin_roster', lambda: roster_q.input('citizen0001').run())
+
+
+def _dir_bytes(workdir, names):
+    return sum(os.path.getsize(os.path.join(workdir, n)) for n in os.listdir(workdir)
+               if any(n.startswith(prefix) for prefix in names))
+
+
+def worker(size, sessions, timeout):
+    # 임시 디렉터리에 앱을 복사하고 생성한 데이터로 시나리오를 돌린다
+    workdir = tempfile.mkdtemp(prefix=f'nation-bench-{size}-')
+    try:
+        for name in os.listdir(ROOT):
+            if name.endswith('.py'):
+                shutil.copy(os.path.join(ROOT, name), workdir)
+        if os.path.isdir(os.path.join(ROOT, '.streamlit')):
+            shutil.copytree(os.path.join(ROOT, '.streamlit'), os.path.join(workdir, '.streamlit'))
+        write(generate(SIZES[size]), os.path.join(workdir, 'nation_data.json'))
+        # 생성한 파일은 예전 형식이라 첫 실행 때 이관(섹션 분리, 글 보관 등)이 일어난다.
+        # 한 번만 일어나는 일이므로 별도 프로세스에서 미리 끝내고, 측정은 재시작 상태에서 한다.
+        subprocess.run([sys.executable, '-c', 'import storage; storage.open_storage().flush()'],
+                       cwd=workdir, check=True)
+        os.chdir(workdir)
+        sys.path.insert(0, workdir)
+
+        driver = Driver(workdir, timeout)
+        # 첫 세션은 데이터 적재(콜드 스타트)를 포함하므로 따로 기록한다
+        driver.session()
+        driver.samples['cold_start'] = driver.samples.pop('open')
+        for i in range(sessions):
+            driver.citizen(i)
+            driver.admin(i)
+
+        import storage
+        time.sleep(storage.COMMIT_WINDOW * 5)  # 기다리지 않은 기록(글 등록)이 저널에 닿도록
+        written = _dir_bytes(workdir, ('nation_data.journal', 'nation_data.db', 'nation_reports.db'))
+
+        data = storage.load_data()
+        save_ms = []
+        for _ in range(3):
+            start = time.perf_counter()
+            storage.save_data(data)
+            save_ms.append((time.perf_counter() - start) * 1000)
+
+        return {
+            "size": size,
+            "backend": storage.STORAGE_BACKEND,
+            "sessions": sessions,
+            "latency_ms": {label: summarize(v) for label, v in sorted(driver.samples.items())},
+            "save_data_ms": round(statistics.median(save_ms), 2),
+            "snapshot_bytes": os.path.getsize(storage.DATA_FILE),
+            "written_bytes": written,
+            # 리눅스의 ru_maxrss 는 KB 단위
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- 결과 비교 / 출력 ---
+
+def compare(result, baseline, tolerance):
+    # (지표, 기준값, 현재값) 회귀 목록
+    regressions = []
+
+    def check(name, base, now, floor=0):
+        if base is not None and now > base * tolerance and now - base > floor:
+            regressions.append((name, base, now))
+
+    for label, stats in result['latency_ms'].items():
+        base = baseline['latency_ms'].get(label)
+        if base:
+            check(f'{label} p90 ms', base['p90'], stats['p90'], LATENCY_FLOOR_MS)
+    for key in ('save_data_ms', 'snapshot_bytes', 'peak_rss_mb'):
+        check(key, baseline.get(key), result[key])
+    return regressions
+
+
+def print_result(result):
+    print(f"\n== {result['backend']} / {result['size']} ({result['sessions']} sessions)")
+    print(f"{'action':<14}{'n':>5}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for label, s in result['latency_ms'].items():
+        print(f"{label:<14}{s['n']:>5}{s['p50']:>10}{s['p90']:>10}{s['p99']:>10}{s['max']:>10}")
+    print(f"save_data {result['save_data_ms']} ms · snapshot {result['snapshot_bytes']:,} B · "
+          f"written {result['written_bytes']:,} B · peak RSS {result['peak_rss_mb']} MB")
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='가상국가 포털 벤치마크')
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=['1k', '10k'])
+    parser.add_argument('--sessions', type=int, default=5, help='규모마다 실행할 시민/관리자 세션 수')
+    parser.add_argument('--timeout', type=float, default=300, help='AppTest 재실행 제한 시간(초)')
+    parser.add_argument('--compare', action='store_true', help='기준값과 비교해 회귀가 있으면 실패')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='허용 배율')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--worker', choices=SIZES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.sessions, args.timeout)))
+        return 0
+
+    baseline = load_baseline()
+    failed = False
+    for size in args.sizes:
+        # 최대 RSS 를 규모별로 재기 위해 작업 프로세스를 따로 띄운다
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', size,
+             '--sessions', str(args.sessions), '--timeout', str(args.timeout)],
+            capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            return out.returncode
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print_result(result)
+        key = f"{result['backend']}/{size}"
+        if args.compare and key not in baseline:
+            print(f'기준값 없음: {key}')
+        elif args.compare:
+            for name, base, now in compare(result, baseline[key], args.tolerance):
+                failed = True
+                print(f'회귀: {name} {base} -> {now}')
+        if args.save_baseline:
+            baseline[key] = result
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'\n기준값 저장: {BASELINE_FILE}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
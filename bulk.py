@@ -0,0 +1,182 @@
+import csv
+import io
+import math
+import os
+import tempfile
+import time
+
+import jsonio
+from metrics import registry as metrics
+from timeindex import normalize_timestamp
+
+# ==========================================
+# 게시글 / 시민 대량 내보내기 · 가져오기
+# ==========================================
+# 내보내기는 저장소의 iter_posts / iter_users 가 한 건씩 내주는 레코드를 JSONL 또는 CSV
+# 한 줄로 바꿔 임시 파일에 이어 쓰고, 다 쓰면 bytes 로 읽어 넘긴다. 전체 목록이나 data dict 를 다시 만들지 않는다.
+# (Streamlit 은 내려받을 파일을 메모리에 올려 두고 제공하므로, 완성된 파일 한 벌은 메모리에 있다)
+#
+# 가져오기는 올린 파일을 한 줄씩 읽어 검사하고, IMPORT_CHUNK 건씩 모아 연산 하나로 반영한다.
+# 잘못된 줄은 건너뛰고 줄 번호와 이유를 남긴다. 이미 있는 게시글 id / 시민 ID 는 건너뛴다.
+
+POST_FIELDS = ('id', 'author', 'title', 'content', 'timestamp', 'category')
+USER_FIELDS = ('username', 'password', 'createdAt')
+CATEGORIES = ('general', 'petition')
+IMPORT_CHUNK = int(os.environ.get('NATION_IMPORT_CHUNK', '500'))
+# 화면에 보여줄 오류 줄 수
+MAX_ERRORS = 20
+# 시민 ID 로 쓸 수 없는 이름 (관리자 표시 / 관리자 글 작성자 이름과 헷갈리지 않게). 대소문자 무시
+RESERVED_USERNAMES = frozenset({'admin', '대통령실'})
+# 받을 수 있는 시각(초)의 범위: 1970년부터 지금 + 하루까지 (서버 간 시계 차이를 감안)
+TIME_FUTURE_SLACK = 86400
+
+
+# --- 내보내기 ---
+
+def jsonl_lines(records):
+    for record in records:
+        yield jsonio.dumps(record) + b'\n'
+
+
+def csv_lines(records, fields):
+    # 엑셀에서 한글이 깨지지 않도록 BOM 을 붙인다
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    yield b'\xef\xbb\xbf' + buf.getvalue().encode('utf-8')
+    for record in records:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([record.get(f, '') for f in fields])
+        yield buf.getvalue().encode('utf-8')
+
+
+def spool(lines, kind):
+    # 줄 단위로 임시 파일에 쓴 뒤 한 번에 읽어 bytes 로 돌려준다 (임시 파일은 여기서 닫는다).
+    # st.download_button 의 지연 콜백은 bytes / str / 일부 파일 객체만 받고
+    # tempfile.TemporaryFile (BufferedRandom) 은 받지 않는다
+    count = -1 if kind.endswith('csv') else 0  # CSV 머리글 줄은 세지 않는다
+    with tempfile.TemporaryFile() as f:
+        for line in lines:
+            f.write(line)
+            count += 1
+        f.seek(0)
+        data = f.read()
+    metrics.inc('exported_records_total', count, kind=kind)
+    return data
+
+
+# --- 가져오기 ---
+
+def read_records(fileobj, fmt):
+    # (줄 번호, dict 또는 오류) 를 하나씩
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for lineno, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = jsonio.loads(line)
+            except ValueError:
+                yield lineno, ValueError('JSON 형식 오류')
+                continue
+            yield lineno, record if isinstance(record, dict) else ValueError('객체가 아님')
+    finally:
+        text.detach()  # 올린 파일 객체는 닫지 않는다
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None or isinstance(value, (dict, list)):
+        raise ValueError(f'{field} 없음')
+    return str(value)
+
+
+def _number(record, field):
+    try:
+        value = float(record[field])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f'{field} 가 숫자가 아님')
+    # nan / inf 는 float() 을 통과하지만 정렬 키와 날짜 계산을 망가뜨린다
+    if not math.isfinite(value):
+        raise ValueError(f'{field} 가 유한한 숫자가 아님')
+    return value
+
+
+def _time(value, field):
+    if not 0 <= value <= time.time() + TIME_FUTURE_SLACK:
+        raise ValueError(f'{field} 가 받을 수 있는 시각 범위를 벗어남')
+    return value
+
+
+def validate_post(record):
+    post = {f: _text(record, f) for f in ('id', 'author', 'title', 'content', 'category')}
+    if not post['id']:
+        raise ValueError('id 없음')
+    if post['category'] not in CATEGORIES:
+        raise ValueError(f"알 수 없는 category: {post['category']}")
+    # 예전 내보내기 파일의 밀리초 시각도 받는다
+    post['timestamp'] = _time(normalize_timestamp(_number(record, 'timestamp')), 'timestamp')
+    return post
+
+
+def reserved_username(username):
+    return username.strip().lower() in RESERVED_USERNAMES
+
+
+def validate_user(record):
+    user = {f: _text(record, f) for f in ('username', 'password')}
+    if not user['username'] or not user['password']:
+        raise ValueError('ID 또는 비밀번호 없음')
+    if reserved_username(user['username']):
+        raise ValueError(f"쓸 수 없는 ID: {user['username']}")
+    user['createdAt'] = _time(_number(record, 'createdAt'), 'createdAt')
+    return user
+
+
+class ImportResult:
+    def __init__(self):
+        self.applied = 0   # 반영 요청한 레코드 수 (이미 있던 것 포함)
+        self.invalid = 0
+        self.errors = []   # (줄 번호, 이유) 처음 MAX_ERRORS 개
+
+    def error(self, lineno, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((lineno, str(reason)))
+
+
+def import_stream(fileobj, fmt, validate, apply, kind, chunk=IMPORT_CHUNK, progress=None):
+    # apply(batch) 는 레코드 묶음 하나를 반영한다 (기록이 끝날 때까지 기다리는 편이 좋다).
+    # progress(result) 는 묶음마다 호출된다.
+    result = ImportResult()
+    batch = []
+
+    def flush(batch):
+        # 묶음 리스트는 연산에 그대로 담기므로 반영한 뒤 비우지 않고 새 리스트를 쓴다
+        apply(batch)
+        result.applied += len(batch)
+        metrics.inc('imported_records_total', len(batch), kind=kind)
+        if progress:
+            progress(result)
+
+    for lineno, record in read_records(fileobj, fmt):
+        if isinstance(record, Exception):
+            result.error(lineno, record)
+            continue
+        try:
+            batch.append(validate(record))
+        except ValueError as e:
+            result.error(lineno, e)
+            continue
+        if len(batch) >= chunk:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return result
@@ -0,0 +1,115 @@
+import itertools
+import os
+import threading
+from collections import deque
+
+from metrics import registry as metrics
+
+# ==========================================
+# 변경 기록 (change feed)
+# ==========================================
+# 저장소에 반영된 연산을 번호(seq)를 붙여 최근 것부터 일정 개수만 메모리에 둔다.
+# 세션은 마지막으로 본 번호를 들고 있다가 since(seq) 로 그 뒤의 연산만 받아
+# 자기 화면(자유 광장 페이지)에 반영한다. 파일을 다시 읽지 않는다.
+#   - 이 프로세스의 commit 과, 다른 프로세스가 붙인 저널 꼬리(refresh)가 모두 기록된다.
+#   - 저장소가 데이터를 통째로 다시 읽으면(다른 프로세스의 compaction, SQLite 외부 변경)
+#     이어지는 연산을 알 수 없으므로 reset() 한다. 그 이전 번호로 묻는 세션은 None 을 받고
+#     화면을 새로 조회한다. 기록이 넘쳐 오래된 항목이 밀려난 경우도 같다.
+
+CHANGE_LOG_SIZE = int(os.environ.get('NATION_CHANGE_LOG_SIZE', '1000'))
+
+
+class ChangeFeed:
+    def __init__(self, size=CHANGE_LOG_SIZE):
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=size)  # (seq, op). seq 는 1씩 증가한다
+        self.seq = 0
+
+    def publish(self, op):
+        with self._lock:
+            self.seq += 1
+            self._log.append((self.seq, op))
+
+    def reset(self):
+        with self._lock:
+            self.seq += 1
+            self._log.clear()
+
+    def since(self, seq):
+        # seq 다음부터의 연산 목록. 그 사이 기록이 끊겼으면 None
+        with self._lock:
+            floor = self._log[0][0] - 1 if self._log else self.seq
+            if seq < floor or seq > self.seq:
+                return None
+            return [op for _, op in itertools.islice(self._log, seq - floor, None)]
+
+
+class FeedView:
+    # 세션이 보고 있는 자유 광장 한 페이지 (st.session_state 에 둔다).
+    # 첫 페이지에는 새 글이 앞에 붙고, 어느 페이지든 삭제/숨김된 글은 빠진다.
+    # 기간(since/until, 초)을 정했으면 그 기간의 글만 보여준다.
+    def __init__(self, store, category, cursor, limit, key, since=None, until=None):
+        # key(post) 는 피드 정렬 키 (storage.post_cursor)
+        self.store = store
+        self.category = category
+        self.cursor = cursor
+        self.limit = limit
+        self.key = key
+        self.since = since
+        self.until = until
+        self.added = 0  # 마지막 sync 에서 반영한 새 글 수
+        self._reload()
+
+    def matches(self, store, category, cursor, since=None, until=None):
+        return (self.store is store and self.category == category and self.cursor == cursor
+                and self.since == since and self.until == until)
+
+    def _reload(self):
+        # 조회 전에 번호를 읽어 두므로 조회와 겹친 연산은 다음 sync 에서 한 번 더 적용된다 (멱등)
+        self.seq = self.store.changes.seq
+        self.posts, self.next_cursor = self.store.page_posts(self.category, self.cursor, self.limit,
+                                                             self.since, self.until)
+        metrics.inc('feed_sync_total', mode='reload')
+
+    def sync(self):
+        self.added = 0
+        changes = self.store.changes.since(self.seq)
+        if changes is None:
+            self._reload()
+        elif changes:
+            self.seq += len(changes)
+            self._apply(changes)
+            metrics.inc('feed_sync_total', mode='delta')
+        hidden = self.store.moderation.hidden
+        if hidden:
+            self.posts = [p for p in self.posts if p['id'] not in hidden]
+        return self.posts
+
+    def _apply(self, changes):
+        removed = {op['id'] for op in changes if op['op'] == 'delete_post'}
+        added = []
+        if self.cursor is None:
+            known = {p['id'] for p in self.posts}
+            for op in changes:
+                new = [op['post']] if op['op'] == 'add_post' else op['posts'] if op['op'] == 'add_posts' else ()
+                for post in new:
+                    if (post['id'] not in known and post['id'] not in removed
+                            and self.category in (None, post['category']) and self._in_range(post)):
+                        added.append(post)
+                        known.add(post['id'])
+        posts = [p for p in self.posts if p['id'] not in removed]
+        if self.next_cursor is not None:
+            # 가져온 오래된 글 중 다음 페이지 이후에 놓일 글은 이 페이지에 넣지 않는다
+            added = [p for p in added if self.key(p) > tuple(self.next_cursor)]
+        if added:
+            new_ids = {p['id'] for p in added}
+            posts = sorted(added + posts, key=self.key, reverse=True)
+            self.added = sum(1 for p in posts[:self.limit] if p['id'] in new_ids)
+            if len(posts) > self.limit:
+                posts = posts[:self.limit]
+                self.next_cursor = self.key(posts[-1])
+        self.posts = posts
+
+    def _in_range(self, post):
+        ts = self.key(post)[0]
+        return (self.since is None or ts >= self.since) and (self.until is None or ts < self.until)
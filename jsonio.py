@@ -0,0 +1,31 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # 선택 의존성: 없으면 표준 json 으로 같은 형식을 만든다
+    orjson = None
+
+# ==========================================
+# JSON 직렬화
+# ==========================================
+# 저장 파일(스냅샷, 저널, details 섹션)은 공백 없는 한 줄 JSON 으로 쓴다.
+# orjson 이 설치되어 있으면 그것을 쓰고, 없으면 표준 json 을 쓴다.
+# 사람이 읽기 위한 들여쓰기 형식은 관리자 내보내기(dumps_pretty)에서만 만든다.
+# 문자열 안의 줄바꿈은 항상 이스케이프되므로 결과에는 줄바꿈이 없다.
+
+
+def dumps(obj):
+    # bytes
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dumps_pretty(obj):
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
@@ -0,0 +1,204 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 성능 계측
+# ==========================================
+# 재실행/페이지/저장 시간을 히스토그램으로, 재실행·기록 횟수 등을 카운터로 모은다.
+# 값은 프로세스 전체가 공유하는 registry 하나에 쌓이며 모든 세션의 합계다.
+# 관측 한 번은 잠금 + 구간 탐색뿐이라 운영 중에도 켜 둘 수 있다.
+#
+# Prometheus 텍스트 형식으로 내보낼 수 있다 (둘 다 선택 사항).
+#   NATION_METRICS_FILE : 이 파일에 주기적으로 기록 (node_exporter textfile 수집기용)
+#   NATION_METRICS_PORT : 127.0.0.1:<포트>/metrics 로 제공
+
+METRICS_FILE = os.environ.get('NATION_METRICS_FILE')
+METRICS_PORT = os.environ.get('NATION_METRICS_PORT')
+EXPORT_INTERVAL = float(os.environ.get('NATION_METRICS_INTERVAL', '15'))
+# 이 시간(초) 안에 재실행한 세션을 접속 중으로 센다
+SESSION_TTL = 300
+PREFIX = 'nation_'
+
+# 히스토그램 구간 상한 (밀리초)
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+
+    def quantile(self, q):
+        # 구간 상한으로 근사한다. 마지막 구간을 넘으면 inf
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (float('inf'),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}    # (이름, 라벨) -> 값
+        self.histograms = {}  # (이름, 라벨) -> Histogram
+        self.gauges = {}      # 이름 -> 값을 돌려주는 함수 (내보낼 때 계산)
+        self._sessions = {}   # 세션 id -> 마지막 재실행 시각
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, ms, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(ms)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+    def timed(self, name, **labels):
+        # 함수 전체를 재는 데코레이터
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def touch_session(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = now
+
+    def active_sessions(self):
+        cutoff = time.time() - SESSION_TTL
+        with self._lock:
+            for sid in [s for s, t in self._sessions.items() if t < cutoff]:
+                del self._sessions[sid]
+            return len(self._sessions)
+
+    def snapshot(self):
+        # (카운터, 히스토그램 복사본) — 화면 표시용
+        with self._lock:
+            hists = {}
+            for key, h in self.histograms.items():
+                copy = Histogram()
+                copy.counts, copy.count, copy.sum = list(h.counts), h.count, h.sum
+                hists[key] = copy
+            return dict(self.counters), hists
+
+    def prometheus(self):
+        counters, hists = self.snapshot()
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f'# TYPE {PREFIX}{name} counter')
+            for (n, key), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f'{PREFIX}{name}{_label_text(key)} {value}')
+        gauges = dict(self.gauges, active_sessions=self.active_sessions,
+                      uptime_seconds=lambda: round(time.time() - self.started))
+        for name, fn in sorted(gauges.items()):
+            lines.append(f'# TYPE {PREFIX}{name} gauge')
+            lines.append(f'{PREFIX}{name} {fn()}')
+        for name in sorted({n for n, _ in hists}):
+            lines.append(f'# TYPE {PREFIX}{name}_ms histogram')
+            for (n, key), h in sorted(hists.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS + ('+Inf',), h.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}{name}_ms_bucket{_label_text(key, [("le", bound)])} {cumulative}')
+                lines.append(f'{PREFIX}{name}_ms_sum{_label_text(key)} {round(h.sum, 3)}')
+                lines.append(f'{PREFIX}{name}_ms_count{_label_text(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Metrics()
+
+
+# --- 내보내기 ---
+
+def _write_file_loop(path):
+    while True:
+        time.sleep(EXPORT_INTERVAL)
+        try:
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(registry.prometheus())
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(path=METRICS_FILE, port=METRICS_PORT):
+    # 설정된 내보내기를 프로세스당 한 번만 시작한다
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if path:
+        threading.Thread(target=_write_file_loop, args=(path,), name='nation-metrics-file', daemon=True).start()
+    if port:
+        server = ThreadingHTTPServer(('127.0.0.1', int(port)), _Handler)
+        threading.Thread(target=server.serve_forever, name='nation-metrics-http', daemon=True).start()
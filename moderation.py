@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+
+# ==========================================
+# 신고 관리 (모더레이션)
+# ==========================================
+# 신고 내역은 국가 데이터(스냅샷/게시글 목록)에 넣지 않고 별도 SQLite 테이블에 둔다.
+#   - post_reports  : 신고 상세. (post_id, reporter) 가 기본 키라 같은 시민의 중복 신고는 막힌다.
+#   - report_counts : 게시글별 신고 수와 숨김 여부. count 색인으로 "신고 많은 글" 순 조회.
+# 신고 수가 REPORT_HIDE_THRESHOLD 에 닿으면 글은 자동으로 숨겨진다.
+# 글별 신고자 집합은 처음 조회할 때 읽어 메모리에 두고 중복 여부를 O(1)로 판단한다.
+
+REPORTS_DB_FILE = os.environ.get('NATION_REPORTS_DB_FILE', 'nation_reports.db')
+REPORT_HIDE_THRESHOLD = int(os.environ.get('NATION_REPORT_HIDE_THRESHOLD', '5'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS post_reports (
+    post_id TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (post_id, reporter)
+);
+CREATE TABLE IF NOT EXISTS report_counts (
+    post_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    hidden INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_report_counts_count ON report_counts (count);
+"""
+
+
+class ReportStore:
+    def __init__(self, db_file=REPORTS_DB_FILE, threshold=REPORT_HIDE_THRESHOLD):
+        self.threshold = threshold
+        self.db_file = db_file
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._load()
+
+    def _load(self):
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self._reporters = {}
+        self.hidden = {r[0] for r in self.conn.execute('SELECT post_id FROM report_counts WHERE hidden = 1')}
+
+    def refresh(self):
+        # 다른 프로세스가 신고를 기록했으면 숨김 목록과 신고자 캐시를 다시 읽는다
+        with self._lock:
+            if self.conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+                self._load()
+
+    def _reporters_for(self, post_id):
+        reporters = self._reporters.get(post_id)
+        if reporters is None:
+            reporters = {r[0] for r in self.conn.execute(
+                'SELECT reporter FROM post_reports WHERE post_id = ?', (post_id,))}
+            self._reporters[post_id] = reporters
+        return reporters
+
+    def report(self, post_id, reporter, reason, timestamp):
+        # 새 신고면 True, 이미 신고한 시민이면 False
+        with self._lock:
+            reporters = self._reporters_for(post_id)
+            if reporter in reporters:
+                return False
+            with self.conn:
+                cur = self.conn.execute(
+                    'INSERT OR IGNORE INTO post_reports VALUES (?, ?, ?, ?)',
+                    (post_id, reporter, reason, timestamp)
+                )
+                reporters.add(reporter)
+                if cur.rowcount == 0:
+                    return False
+                self.conn.execute(
+                    'INSERT INTO report_counts (post_id, count) VALUES (?, 1) '
+                    'ON CONFLICT (post_id) DO UPDATE SET count = count + 1',
+                    (post_id,)
+                )
+                self._hide_over_threshold([post_id])
+            return True
+
+    def _hide_over_threshold(self, post_ids):
+        rows = self.conn.execute(
+            f'SELECT post_id FROM report_counts WHERE hidden = 0 AND count >= ? '
+            f'AND post_id IN ({",".join("?" * len(post_ids))})',
+            [self.threshold, *post_ids]
+        ).fetchall()
+        for (post_id,) in rows:
+            self.conn.execute('UPDATE report_counts SET hidden = 1 WHERE post_id = ?', (post_id,))
+            self.hidden.add(post_id)
+
+    def import_reports(self, posts):
+        # 예전 형식(post['reports'] 목록)의 신고를 옮긴다. 여러 번 실행해도 결과는 같다.
+        rows = [(p['id'], r['reporter'], r['reason'], r['timestamp'])
+                for p in posts for r in p.get('reports', [])]
+        if not rows:
+            return
+        post_ids = list({r[0] for r in rows})
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO post_reports VALUES (?, ?, ?, ?)', rows)
+            for post_id in post_ids:
+                self.conn.execute(
+                    'INSERT INTO report_counts (post_id, count) '
+                    'SELECT ?, COUNT(*) FROM post_reports WHERE post_id = ? '
+                    'ON CONFLICT (post_id) DO UPDATE SET count = excluded.count',
+                    (post_id, post_id)
+                )
+                self._reporters.pop(post_id, None)
+            self._hide_over_threshold(post_ids)
+
+    def dismiss(self, post_id):
+        # 글 삭제 또는 신고 기각: 해당 글의 신고 내역을 모두 지운다
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM post_reports WHERE post_id = ?', (post_id,))
+            self.conn.execute('DELETE FROM report_counts WHERE post_id = ?', (post_id,))
+            self._reporters.pop(post_id, None)
+            self.hidden.discard(post_id)
+
+    def most_reported(self, limit=20):
+        # [(post_id, 신고 수, 숨김 여부)] 신고 수 내림차순
+        with self._lock:
+            return [(r[0], r[1], bool(r[2])) for r in self.conn.execute(
+                'SELECT post_id, count, hidden FROM report_counts ORDER BY count DESC LIMIT ?', (limit,))]
+
+    def reports_for(self, post_id, limit=50):
+        with self._lock:
+            return [{"reporter": r[0], "reason": r[1], "timestamp": r[2]} for r in self.conn.execute(
+                'SELECT reporter, reason, timestamp FROM post_reports WHERE post_id = ? '
+                'ORDER BY timestamp DESC LIMIT ?', (post_id, limit))]
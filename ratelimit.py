@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+from metrics import registry as metrics
+
+# ==========================================
+# 요청 제한 (토큰 버킷)
+# ==========================================
+# 글 등록 / 신고 / 로그인 시도를 사용자별로 제한한다. 로그인 전에는 세션 id 를 키로 쓴다.
+# 동작마다 "횟수/초" 로 설정하며, 버킷은 횟수만큼 가득 찬 상태에서 시작해
+# 초 동안 횟수만큼 다시 찬다 (예: 5/60 은 연속 5번, 이후 12초마다 1번).
+#   NATION_RATE_POST   (기본 5/60)
+#   NATION_RATE_REPORT (기본 10/60)
+#   NATION_RATE_LOGIN  (기본 5/60)
+# 버킷은 서버 프로세스 메모리에 있고 모든 세션이 공유한다. 다시 가득 찬 버킷은 지운다.
+
+DEFAULT_LIMITS = {'post': '5/60', 'report': '10/60', 'login': '5/60'}
+# 이 간격(초)마다 가득 찬 버킷을 정리한다
+PRUNE_INTERVAL = 60
+
+
+def parse_limit(text):
+    # "횟수/초" -> (용량, 초당 충전량)
+    count, _, seconds = text.partition('/')
+    return float(count), float(count) / float(seconds)
+
+
+class RateLimiter:
+    def __init__(self, limits=None):
+        self._lock = threading.Lock()
+        self.limits = {action: parse_limit(os.environ.get(f'NATION_RATE_{action.upper()}', default))
+                       for action, default in (limits or DEFAULT_LIMITS).items()}
+        self._buckets = {}   # (동작, 키) -> [남은 토큰, 마지막 갱신 시각]
+        self.allowed = dict.fromkeys(self.limits, 0)
+        self.throttled = dict.fromkeys(self.limits, 0)
+        self._pruned = time.monotonic()
+
+    def hit(self, action, key):
+        # 토큰 하나를 쓴다. 허용되면 0, 막히면 다음 토큰까지 기다릴 초
+        capacity, rate = self.limits[action]
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((action, key))
+            if bucket is None:
+                bucket = self._buckets[(action, key)] = [capacity, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                self.allowed[action] += 1
+                wait = 0
+            else:
+                bucket[0] = tokens
+                self.throttled[action] += 1
+                wait = (1 - tokens) / rate
+            if now - self._pruned > PRUNE_INTERVAL:
+                self._prune(now)
+        if wait:
+            metrics.inc('throttled_total', action=action)
+        return wait
+
+    def _prune(self, now):
+        self._pruned = now
+        for key, (tokens, last) in list(self._buckets.items()):
+            capacity, rate = self.limits[key[0]]
+            if tokens + (now - last) * rate >= capacity:
+                del self._buckets[key]
+
+    def status(self):
+        # 관리자 화면용: 동작마다 (설정, 허용 수, 차단 수, 지금 막힌 키 목록)
+        now = time.monotonic()
+        with self._lock:
+            blocked = {action: [] for action in self.limits}
+            for (action, key), (tokens, last) in self._buckets.items():
+                capacity, rate = self.limits[action]
+                if tokens + (now - last) * rate < 1:
+                    blocked[action].append(key)
+            return [(action, self.limits[action], self.allowed[action], self.throttled[action], sorted(blocked[action]))
+                    for action in self.limits]
+
+
+limiter = RateLimiter()
+metrics.gauge('rate_limit_buckets', lambda: len(limiter._buckets))
@@ -0,0 +1,179 @@
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from metrics import registry as metrics
+from timeindex import day_of
+
+# ==========================================
+# HTML 렌더링 캐시
+# ==========================================
+# Streamlit 은 상호작용마다 app.py 전체를 다시 실행한다. 내용이 바뀌지 않은
+# 카드/페이지 HTML 은 여기서 한 번만 만들고 재사용한다.
+#   - 게시글 카드: 표시되는 필드 값을 키로 하는 LRU 캐시
+#   - 정적 페이지: 그리는 항목의 버전(store.part_version)을 값에 붙여 두는 캐시
+
+
+class VersionedCache:
+    # 키마다 값과 만들 때의 버전을 둔다. 버전이 다르면 그 키만 다시 만든다.
+    # 키에는 바뀌는 값(기간 시작, 오늘 날짜 등)을 넣지 않고 버전에 넣어 키 수가 늘지 않게 한다
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def get(self, version, key, build):
+        with self._lock:
+            item = self._items.get(key)
+        if item is not None and item[0] == version:
+            metrics.inc('page_cache_total', result='hit')
+            return item[1]
+        metrics.inc('page_cache_total', result='miss')
+        value = build()
+        with self._lock:
+            self._items[key] = (version, value)
+        return value
+
+
+page_cache = VersionedCache()
+
+
+def post_card_html(post):
+    return _post_card_html(post['category'], post['timestamp'], post['title'], post['content'], post['author'])
+
+
+@lru_cache(maxsize=4096)
+def _post_card_html(category, timestamp, title, content, author):
+    return f"""
+        <div class="card">
+            <div style="display:flex; justify-content:space-between; align-items:center;">
+                <span style="background-color:{'#fef3c7' if category=='petition' else '#f1f5f9'}; color:{'#b45309' if category=='petition' else '#64748b'}; padding:2px 8px; border-radius:4px; font-size:0.8rem; font-weight:bold;">
+                    {'📢 신문고' if category=='petition' else '💬 자유'}
+                </span>
+                <span style="font-size:0.8rem; color:#94a3b8;">{day_of(timestamp)}</span>
+            </div>
+            <h4 style="margin:0.5rem 0;">{title}</h4>
+            <p style="font-size:0.9rem; color:#475569;">{content}</p>
+            <div style="margin-top:0.5rem; font-size:0.8rem; color:#64748b;">
+                작성자: <b>{author}</b>
+            </div>
+        </div>
+        """
+
+
+metrics.gauge('post_card_cache_hits', lambda: _post_card_html.cache_info().hits)
+metrics.gauge('post_card_cache_misses', lambda: _post_card_html.cache_info().misses)
+
+
+def overview_hero_html(stats, flag_url):
+    return f"""
+        <div class="card" style="background: linear-gradient(135deg, #1e1b4b 0%, #312e81 100%); color: white;">
+            <div style="display:flex; align-items:center; justify-content:space-between; flex-wrap:wrap;">
+                <div>
+                    <h1 style="font-size:3rem; font-weight:800; margin-bottom:0;">{stats['formalName']}</h1>
+                    <p style="font-size:1.2rem; font-style:italic; opacity:0.8;">"{stats['motto']}"</p>
+                </div>
+                <img src="{flag_url}" style="width:150px; border-radius:10px; border:2px solid white; box-shadow:0 10px 15px -3px rgba(0,0,0,0.1);">
+            </div>
+            <div style="margin-top:2rem; display:flex; gap:2rem; flex-wrap:wrap;">
+                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">수도</span><br/>{stats['capital']}</div>
+                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">인구</span><br/>{stats['population']}</div>
+                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">화폐</span><br/>{stats['currency']}</div>
+                <div><span style="opacity:0.6; font-size:0.8rem; font-weight:bold;">언어</span><br/>{stats['language']}</div>
+            </div>
+        </div>
+        """
+
+
+def overview_politics_md(stats):
+    return f"""
+        - **정치 체제:** {stats['politicalSystem']}
+        - **경제 체제:** {stats['economicSystem']}
+        - **국가 원수:** {stats['headOfState']}
+        - **정부 수반:** {stats['headOfGovernment']}
+        - **집권 여당:** {stats['rulingParty']}
+        - **의회:** {stats['parliament']}
+        """
+
+
+def history_eras(history):
+    return [
+        ("고대사 (Ancient)", history['ancient']),
+        ("중세사 (Medieval)", history['medieval']),
+        ("근대사 (Modern)", history['modern']),
+        ("현대사 (Contemporary)", history['contemporary']),
+    ]
+
+
+def defense_dashboard_html(overview_text, readiness):
+    return f"""
+    <div class="card" style="background-color: #1e293b; color: white;">
+        <h3>🛡️ 국방 백서 요약</h3>
+        <p>{overview_text}</p>
+        <div style="margin-top:1rem; display:flex; gap:1rem;">
+            <div style="background:#dc2626; padding:0.5rem 1rem; border-radius:0.5rem; font-weight:bold;">데프콘 4단계</div>
+            <div style="background:#4f46e5; padding:0.5rem 1rem; border-radius:0.5rem; font-weight:bold;">준비태세 {readiness}%</div>
+        </div>
+    </div>
+    """
+
+
+def _format_value(value):
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.2f}".rstrip('0').rstrip('.')
+
+
+def trend_chart_html(label, ts, values, width=300, height=80):
+    # 지표 추이 카드 (인라인 SVG 꺾은선). ts / values 는 이미 줄인 배열
+    if len(values) == 0:
+        return ""
+    lo, hi = float(values.min()), float(values.max())
+    t0, t1 = float(ts[0]), float(ts[-1])
+    xs = (ts - t0) / (t1 - t0) * width if t1 > t0 else ts * 0 + width / 2
+    ys = height - 4 - (values - lo) / (hi - lo) * (height - 8) if hi > lo else values * 0 + height / 2
+    points = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys))
+    shape = (f'<polyline points="{points}" fill="none" stroke="#4f46e5" stroke-width="2" />' if len(values) > 1
+             else f'<circle cx="{xs[0]:.1f}" cy="{ys[0]:.1f}" r="3" fill="#4f46e5" />')
+    start, end = (datetime.fromtimestamp(t).strftime('%Y-%m-%d') for t in (t0, t1))
+    return f"""
+        <div class="card" style="padding:1rem;">
+            <div style="display:flex; justify-content:space-between; font-size:0.85rem; color:#64748b;">
+                <span>{label}</span><b style="color:#0f172a;">{_format_value(float(values[-1]))}</b>
+            </div>
+            <svg viewBox="0 0 {width} {height}" preserveAspectRatio="none" style="width:100%; height:{height}px;">{shape}</svg>
+            <div style="display:flex; justify-content:space-between; font-size:0.7rem; color:#94a3b8;">
+                <span>{start}</span><span>최저 {_format_value(lo)} · 최고 {_format_value(hi)}</span><span>{end}</span>
+            </div>
+        </div>
+        """
+
+
+def activity_chart_html(days, width=600, height=120):
+    # 게시판 활동 카드 (인라인 SVG 누적 막대). days 는 [(날짜, 자유 글 수, 청원 글 수)] 오래된 날부터
+    top = max((g + p for _, g, p in days), default=0)
+    total = sum(g + p for _, g, p in days)
+    step = width / max(1, len(days))
+    bars = []
+    for i, (day, general, petition) in enumerate(days):
+        if not general + petition:
+            continue
+        x = i * step + step * 0.1
+        h_general = general / top * (height - 4)
+        h_petition = petition / top * (height - 4)
+        bars.append(f'<rect x="{x:.1f}" y="{height - h_general:.1f}" width="{step * 0.8:.1f}" '
+                    f'height="{h_general:.1f}" fill="#94a3b8"><title>{day} 자유 {general}</title></rect>')
+        bars.append(f'<rect x="{x:.1f}" y="{height - h_general - h_petition:.1f}" width="{step * 0.8:.1f}" '
+                    f'height="{h_petition:.1f}" fill="#f59e0b"><title>{day} 청원 {petition}</title></rect>')
+    busiest = max(days, key=lambda d: d[1] + d[2]) if total else None
+    peak = f"최다 {busiest[0]} ({busiest[1] + busiest[2]:,}건)" if busiest else "글 없음"
+    start, end = (days[0][0], days[-1][0]) if days else ("", "")
+    return f"""
+        <div class="card" style="padding:1rem;">
+            <div style="display:flex; justify-content:space-between; font-size:0.85rem; color:#64748b;">
+                <span>날짜별 새 글 <b style="color:#94a3b8;">■</b> 자유 <b style="color:#f59e0b;">■</b> 청원</span>
+                <span>합계 <b style="color:#0f172a;">{total:,}</b>건 · {peak}</span>
+            </div>
+            <svg viewBox="0 0 {width} {height}" preserveAspectRatio="none" style="width:100%; height:{height}px;">{"".join(bars)}</svg>
+            <div style="display:flex; justify-content:space-between; font-size:0.7rem; color:#94a3b8;">
+                <span>{start}</span><span>{end}</span>
+            </div>
+        </div>
+        """
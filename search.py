@@ -0,0 +1,139 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+# ==========================================
+# 자유 광장 게시글 전문 검색 (n-gram 역색인)
+# ==========================================
+# 한국어는 띄어쓰기 단위가 검색어와 맞지 않는 경우가 많아(조사, 붙여쓰기)
+# 단어를 글자 2-gram / 3-gram 으로 쪼개어 색인한다.
+# 색인은 데이터를 읽을 때 한 번 만들고, 이후에는 글 등록/삭제 연산마다 갱신한다.
+# 보관 세그먼트(archive.py)의 글은 세그먼트를 쓸 때 함께 쓴 토큰 목록(segment_postings)으로 찾고,
+# 최신 글과 같은 점수로 섞는다.
+
+FIELD_WEIGHTS = {'title': 3, 'author': 2, 'content': 1}
+
+_WORD = re.compile(r'\w+')
+
+
+def _grams(word, sizes):
+    if len(word) < min(sizes):
+        return [word]
+    return [word[i:i + n] for n in sizes for i in range(len(word) - n + 1)]
+
+
+def tokenize(text):
+    # 색인용: 단어마다 2-gram 과 3-gram 을 모두 만든다
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        tokens += _grams(word, (2, 3))
+    return tokens
+
+
+def query_tokens(text):
+    # 검색용: 3글자 이상 단어는 3-gram 만 써서 후보를 좁힌다
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        tokens += _grams(word, (3,) if len(word) >= 3 else (2,))
+    return list(dict.fromkeys(tokens))
+
+
+def post_weights(post):
+    # 토큰 -> 필드 가중치를 곱한 빈도
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(post.get(field, '')):
+            weights[token] += weight
+    return weights
+
+
+def segment_postings(posts):
+    # 보관 세그먼트용: 토큰 -> [위치, 가중 빈도, 위치, 가중 빈도, ...] (위치는 세그먼트 안에서의 글 순서)
+    postings = defaultdict(list)
+    for i, post in enumerate(posts):
+        for token, weight in post_weights(post).items():
+            postings[token] += (i, weight)
+    return postings
+
+
+class PostIndex:
+    def __init__(self, posts=()):
+        self.postings = defaultdict(dict)  # token -> {post_id: 가중 빈도}
+        self.doc_tokens = {}               # post_id -> 색인된 토큰 (삭제용)
+        self.posts = {}                    # post_id -> post
+        for post in posts:
+            self.add(post)
+
+    def add(self, post):
+        if post['id'] in self.posts:
+            self.remove(post['id'])
+        weights = post_weights(post)
+        for token, weight in weights.items():
+            self.postings[token][post['id']] = weight
+        self.doc_tokens[post['id']] = list(weights)
+        self.posts[post['id']] = post
+
+    def remove(self, post_id):
+        for token in self.doc_tokens.pop(post_id, ()):
+            docs = self.postings[token]
+            docs.pop(post_id, None)
+            if not docs:
+                del self.postings[token]
+        self.posts.pop(post_id, None)
+
+    def apply(self, op):
+        # 저장소 변경 연산에 맞춰 색인을 갱신한다
+        if op['op'] == 'add_post':
+            self.add(op['post'])
+        elif op['op'] == 'add_posts':
+            for post in op['posts']:
+                self.add(post)
+        elif op['op'] == 'delete_post':
+            self.remove(op['id'])
+
+    def match(self, tokens):
+        # 모든 토큰을 포함하는 글 [글], 글별 토큰 가중 빈도 {id: [가중 빈도]}, 토큰별 글 수, 색인된 글 수
+        lists = [self.postings.get(t, {}) for t in tokens]
+        # 가장 짧은 목록부터 교집합
+        candidates = set()
+        if all(lists):
+            smallest, *rest = sorted(lists, key=len)
+            candidates = set(smallest)
+            for docs in rest:
+                candidates &= docs.keys()
+        results = [self.posts[i] for i in candidates]
+        weights = {post_id: [docs[post_id] for docs in lists] for post_id in candidates}
+        return results, weights, [len(docs) for docs in lists], len(self.posts)
+
+    def search(self, text, category=None, limit=50):
+        tokens = query_tokens(text)
+        if not tokens:
+            return []
+        return rank(self.match(tokens), category=category, limit=limit)
+
+
+def rank(matched, archived=None, category=None, limit=50, load=None):
+    # PostIndex.match 결과에 archive.Archive.search 결과(있으면)를 더해 같은 idf 로 점수를 매긴다.
+    # 보관된 글은 상위 limit 개에 든 것만 load(위치 목록) 로 꺼낸다
+    results, weights, doc_counts, total = matched
+    if category is not None:
+        results = [p for p in results if p['category'] == category]
+    hits = []
+    if archived is not None:
+        found, archived_counts, archived_total = archived
+        hits = [hit for hit in found if hit[0] not in weights]
+        doc_counts = [a + b for a, b in zip(doc_counts, archived_counts)]
+        total += archived_total
+    if not results and not hits:
+        return []
+    idf = [math.log(1 + total / n) for n in doc_counts]
+
+    def score(counts):
+        return sum(w * f for w, f in zip(counts, idf))
+    entries = [(score(weights[p['id']]), p['timestamp'], 1, i) for i, p in enumerate(results)]
+    entries += [(score(counts), ts, 0, i) for i, (_, ts, counts, _) in enumerate(hits)]
+    top = heapq.nlargest(limit, entries)
+    loaded = iter(load([hits[i][3] for _, _, hot, i in top if not hot]) if hits else ())
+    ranked = [results[i] if hot else next(loaded) for _, _, hot, i in top]
+    return [p for p in ranked if p is not None]
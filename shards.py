@@ -0,0 +1,57 @@
+import threading
+from collections.abc import Mapping
+
+from metrics import registry as metrics
+
+# ==========================================
+# details 섹션 지연 적재
+# ==========================================
+# details 는 역사/국방/경제/문화/자연/정부 섹션으로 나뉘어 각각 따로 저장된다
+# (JSON 백엔드: nation_details/<섹션>.json, SQLite 백엔드: meta 의 'details.<섹션>' 행).
+# 한 번의 재실행은 메뉴 하나만 그리므로, 섹션은 처음 접근할 때 읽어 두고 재사용한다.
+# 관리자 수정은 해당 섹션 하나만 다시 기록한다.
+
+SECTION_PREFIX = 'details.'
+
+
+class LazySections(Mapping):
+    # 섹션 이름 -> dict. load(name) 으로 처음 접근할 때 읽는다
+    def __init__(self, names, load):
+        self._names = sorted(names)
+        self._load = load
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def __getitem__(self, name):
+        section = self._cache.get(name)
+        if section is not None:
+            return section
+        if name not in self._names:
+            raise KeyError(name)
+        # 읽기는 잠금 밖에서 한다. load 는 저장소의 파일 잠금을 잡는데, 저장소는 파일 잠금을 잡은 채
+        # put() 을 부르므로 여기서 잠금을 쥐고 기다리면 서로 막힌다. 처음 접근이 겹치면 두 번 읽을 수 있다
+        with metrics.timer('shard_load', section=name):
+            section = self._load(name)
+        with self._lock:
+            # 읽는 사이 put() 으로 들어온 섹션이 있으면 그쪽이 더 새 것이다
+            return self._cache.setdefault(name, section)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def loaded(self):
+        return list(self._cache)
+
+    def put(self, name, section):
+        with self._lock:
+            self._cache[name] = section
+            if name not in self._names:
+                self._names = sorted(self._names + [name])
+
+    def drop(self, name):
+        # 다른 프로세스가 바꾼 섹션은 캐시에서 빼서 다음 접근 때 다시 읽게 한다
+        with self._lock:
+            self._cache.pop(name, None)
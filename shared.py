@@ -0,0 +1,400 @@
+import os
+import secrets
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import jsonio
+from metrics import registry as metrics
+from ratelimit import limiter
+
+# ==========================================
+# 서버 프로세스(복제본) 간 공유 상태
+# ==========================================
+# 로드밸런서 뒤에 Streamlit 프로세스를 여러 개 띄우면 세션 상태와 프로세스 메모리는 복제본마다 따로다.
+# 복제본끼리 같아야 하는 작은 상태를 아래 인터페이스 뒤에 둔다.
+#   get_setting(key, default) / set_setting(key, value)
+#                             : 설정 값 (관리자 코드 해시 'admin_pw_hash'). 관리자 코드를 바꾸면 관리자 세션은 모두 끝난다
+#   create_session(info, bind): 로그인 세션을 만들고 토큰을 돌려준다. info 는 {"role": "admin"} 또는
+#                               {"role": "citizen", "username": 시민 ID}. 역할을 이름과 따로 두어 'admin' 같은
+#                               이름의 시민이 관리자로 읽히지 않게 한다
+#   session_user(token, bind) : 살아 있는 세션의 info, 없거나 만료됐거나 bind 가 다르면 None. 물을 때마다 만료를 늦춘다
+#   rotate_session(token, bind)
+#                             : 세션을 새 토큰으로 바꾸고 (새 토큰, info) 를 돌려준다. 예전 토큰은 더 쓸 수 없다
+#   end_session(token)        : 로그아웃
+#   end_user_sessions(users)  : 그 시민들의 세션을 모두 끝낸다 (추방, 비밀번호 변경)
+#   rate_hit(action, key)     : 요청 제한 (ratelimit.RateLimiter.hit). 모든 복제본이 같은 버킷을 쓴다
+#   rate_status()             : 요청 제한 현황 (RateLimiter.status)
+#   publish(channel)          : 채널의 무효화 번호를 올린다
+#   versions()                : {채널: 번호}
+#   subscribe(channel, callback), poll()
+#                             : 재실행마다 poll() 하면 다른 복제본이 publish 한 채널의 callback 을 부른다
+#
+# 구현은 두 가지다.
+#   - LocalState  : 프로세스 메모리. NATION_SHARED_SOCKET 이 없을 때 (프로세스 하나로 돌릴 때)
+#   - SocketState : NATION_SHARED_SOCKET 의 Unix 소켓으로 공유 상태 서버에 붙는다.
+#                   서버는 같은 기계에서 `python shared.py [소켓 경로]` 로 띄운다.
+#                   서버는 LocalState 하나를 소켓으로 내보내며, 요청과 응답은 JSON 한 줄씩이다.
+#                   요청마다 id 를 붙여, 응답을 받기 전에 연결이 끊겨 다시 보낸 요청은 서버가 처음 응답을
+#                   돌려준다 (rate_hit, create_session 같은 연산이 두 번 적용되지 않게).
+# 설정은 NATION_SHARED_STATE_FILE(기본 nation_shared.json)에 저장한다 (LocalState 를 가진 쪽, 서버 또는 단일 프로세스).
+# 세션과 요청 제한 버킷은 메모리에만 있으므로 서버를 다시 띄우면 모두 다시 로그인한다.
+#
+# bind 는 세션을 만든 브라우저에만 있는 값(app.py 의 client_bind)이다. bind 를 주고 만든 세션은 같은 bind 로만
+# 쓸 수 있어서, 토큰만 가져간 다른 브라우저는 세션을 이어받지 못한다.
+# 관리자 세션은 NATION_ADMIN_SESSION_TTL(기본 30분), 시민 세션은 NATION_SESSION_TTL(기본 12시간) 동안 쓰지 않으면 끝난다.
+#
+# 국가 데이터(게시글, 시민, 지표)는 저장소(storage.py)가 복제본 사이에서 맞춘다. JSON 백엔드는 파일 잠금과
+# 저널 꼬리 읽기로, SQLite 백엔드는 data_version 으로 다른 프로세스의 쓰기를 재실행마다 감지하고,
+# 화면 캐시(render.page_cache)는 그때 오르는 저장소의 항목별 버전으로 무효화된다.
+# 여기의 무효화 채널은 저장소 밖에 있는 프로세스 캐시(이미지 자산 목록 등)를 위한 것이다.
+
+SHARED_SOCKET = os.environ.get('NATION_SHARED_SOCKET')
+SHARED_STATE_FILE = os.environ.get('NATION_SHARED_STATE_FILE', 'nation_shared.json')
+SESSION_TTL = float(os.environ.get('NATION_SESSION_TTL', str(12 * 3600)))
+ADMIN_SESSION_TTL = float(os.environ.get('NATION_ADMIN_SESSION_TTL', str(30 * 60)))
+# 이 설정(관리자 코드 해시)이 바뀌면 관리자 세션을 모두 끝낸다
+ADMIN_CODE_SETTING = 'admin_pw_hash'
+# 이 간격(초)마다 만료된 세션을 정리한다
+PRUNE_INTERVAL = 60
+# 다시 보낸 요청을 알아보려고 서버가 기억해 두는 최근 응답 수
+REPLY_CACHE = 4096
+
+# 소켓으로 부를 수 있는 메서드
+OPS = ('get_setting', 'set_setting', 'create_session', 'session_user', 'rotate_session', 'end_session',
+       'end_user_sessions', 'rate_hit', 'rate_status', 'publish', 'versions')
+
+
+class SharedStateError(RuntimeError):
+    pass
+
+
+def _ttl(info):
+    return ADMIN_SESSION_TTL if info['role'] == 'admin' else SESSION_TTL
+
+
+class _Subscriptions:
+    # 무효화 채널 구독 (복제본 쪽). 마지막으로 본 번호와 다르면 callback 을 부른다
+    def __init__(self):
+        self._sub_lock = threading.Lock()
+        self._callbacks = {}
+        self._seen = {}
+
+    def subscribe(self, channel, callback):
+        with self._sub_lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+
+    def publish(self, channel):
+        version = self._publish(channel)
+        with self._sub_lock:
+            # 그 사이 다른 복제본이 올린 번호가 없으면 자기 변경은 다시 받지 않는다
+            if self._seen.get(channel, 0) == version - 1:
+                self._seen[channel] = version
+        return version
+
+    def poll(self):
+        versions = self.versions()
+        with self._sub_lock:
+            changed = [ch for ch, v in versions.items() if self._seen.get(ch, 0) != v and ch in self._callbacks]
+            self._seen.update(versions)
+            callbacks = [cb for ch in changed for cb in self._callbacks[ch]]
+        for callback in callbacks:
+            callback()
+        if changed:
+            metrics.inc('invalidations_total', len(changed))
+
+
+class LocalState(_Subscriptions):
+    def __init__(self, settings_file=None):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.settings_file = settings_file
+        self._settings = {}
+        if settings_file and os.path.exists(settings_file):
+            with open(settings_file, 'rb') as f:
+                self._settings = jsonio.loads(f.read())
+        self._sessions = {}  # 토큰 -> [info, 만료 시각, bind]
+        self._by_user = {}   # 시민 ID -> 토큰 집합
+        self._admins = set()  # 관리자 세션 토큰
+        self._versions = {}
+        self._pruned = time.monotonic()
+
+    # --- 설정 ---
+
+    def get_setting(self, key, default=None):
+        with self._lock:
+            return self._settings.get(key, default)
+
+    def set_setting(self, key, value):
+        with self._lock:
+            if key == ADMIN_CODE_SETTING and self._settings.get(key) != value:
+                for token in list(self._admins):
+                    self._drop(token)
+            self._settings[key] = value
+            if self.settings_file:
+                tmp = self.settings_file + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(jsonio.dumps(self._settings))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.settings_file)
+
+    # --- 로그인 세션 ---
+
+    def create_session(self, info, bind=None):
+        token = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            self._add(token, info, now, bind)
+            if now - self._pruned > PRUNE_INTERVAL:
+                self._prune(now)
+        return token
+
+    def session_user(self, token, bind=None):
+        now = time.monotonic()
+        with self._lock:
+            session = self._live(token, now, bind)
+            if session is None:
+                return None
+            session[1] = now + _ttl(session[0])
+            return session[0]
+
+    def rotate_session(self, token, bind=None):
+        now = time.monotonic()
+        with self._lock:
+            session = self._live(token, now, bind)
+            if session is None:
+                return None
+            self._drop(token)
+            new_token = secrets.token_urlsafe(24)
+            self._add(new_token, session[0], now, session[2])
+            return new_token, session[0]
+
+    def end_session(self, token):
+        with self._lock:
+            self._drop(token)
+
+    def end_user_sessions(self, users):
+        with self._lock:
+            for user in users:
+                for token in list(self._by_user.get(user, ())):
+                    self._drop(token)
+
+    def _add(self, token, info, now, bind):
+        self._sessions[token] = [info, now + _ttl(info), bind]
+        if info['role'] == 'admin':
+            self._admins.add(token)
+        if info.get('username') is not None:
+            self._by_user.setdefault(info['username'], set()).add(token)
+
+    def _live(self, token, now, bind):
+        # 만료됐으면 지우고 None. 다른 bind 로 온 요청이면 세션은 두고 None
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session[1] < now:
+            self._drop(token)
+            return None
+        if session[2] != bind:
+            return None
+        return session
+
+    def _drop(self, token):
+        session = self._sessions.pop(token, None)
+        self._admins.discard(token)
+        if session is None or session[0].get('username') is None:
+            return
+        tokens = self._by_user.get(session[0]['username'])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[session[0]['username']]
+
+    def _prune(self, now):
+        self._pruned = now
+        for token in [t for t, session in self._sessions.items() if session[1] < now]:
+            self._drop(token)
+
+    # --- 요청 제한 ---
+
+    def rate_hit(self, action, key):
+        return limiter.hit(action, key)
+
+    def rate_status(self):
+        return limiter.status()
+
+    # --- 무효화 번호 ---
+
+    def _publish(self, channel):
+        with self._lock:
+            self._versions[channel] = self._versions.get(channel, 0) + 1
+            return self._versions[channel]
+
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+
+class SocketState(_Subscriptions):
+    # 공유 상태 서버의 클라이언트. 연결 하나를 잠금으로 나눠 쓰고, 끊기면 한 번 다시 붙는다
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self._sock, self._file = sock, sock.makefile('rwb')
+
+    def _close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _call(self, op, *args):
+        # 다시 보낼 때도 같은 id 를 쓴다 (서버가 이미 처리했으면 그때의 응답을 받는다)
+        request = jsonio.dumps({"op": op, "args": args, "id": secrets.token_hex(8)}) + b'\n'
+        with metrics.timer('shared', op=op), self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._file is None:
+                        self._connect()
+                    self._file.write(request)
+                    self._file.flush()
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError('공유 상태 서버가 연결을 끊었습니다')
+                    break
+                except OSError as e:
+                    self._close()
+                    if attempt:
+                        raise SharedStateError(f'공유 상태 서버({self.path})에 연결할 수 없습니다: {e}') from e
+        reply = jsonio.loads(line)
+        if 'error' in reply:
+            raise SharedStateError(reply['error'])
+        return reply['result']
+
+    def get_setting(self, key, default=None):
+        return self._call('get_setting', key, default)
+
+    def set_setting(self, key, value):
+        return self._call('set_setting', key, value)
+
+    def create_session(self, info, bind=None):
+        return self._call('create_session', info, bind)
+
+    def session_user(self, token, bind=None):
+        return self._call('session_user', token, bind)
+
+    def rotate_session(self, token, bind=None):
+        rotated = self._call('rotate_session', token, bind)
+        return tuple(rotated) if rotated else None
+
+    def end_session(self, token):
+        return self._call('end_session', token)
+
+    def end_user_sessions(self, users):
+        return self._call('end_user_sessions', list(users))
+
+    def rate_hit(self, action, key):
+        wait = self._call('rate_hit', action, key)
+        if wait:
+            # 버킷은 서버에 있지만 차단 수는 이 복제본의 지표에도 남긴다
+            metrics.inc('throttled_total', action=action)
+        return wait
+
+    def rate_status(self):
+        return self._call('rate_status')
+
+    def _publish(self, channel):
+        return self._call('publish', channel)
+
+    def versions(self):
+        return self._call('versions')
+
+
+def open_shared(path=SHARED_SOCKET):
+    return SocketState(path) if path else LocalState(SHARED_STATE_FILE)
+
+
+state = open_shared()
+
+
+# ==========================================
+# 공유 상태 서버
+# ==========================================
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = jsonio.loads(line)
+                if request['op'] not in OPS:
+                    raise KeyError(request['op'])
+                reply = self._reply(request)
+            except Exception as e:
+                reply = {"error": f'{type(e).__name__}: {e}'}
+            try:
+                self.wfile.write(jsonio.dumps(reply) + b'\n')
+                self.wfile.flush()
+            except OSError:
+                return  # 응답 전에 끊긴 클라이언트. 다시 보내면 _reply 가 같은 응답을 준다
+
+    def _reply(self, request):
+        # 같은 id 의 요청은 한 번만 처리한다. 처리 중에 다시 온 요청은 처음 요청이 끝나기를 기다린다
+        server = self.server
+        with server.replies_lock:
+            entry = server.replies.get(request.get('id'))
+            first = entry is None
+            if first:
+                entry = [threading.Event(), None]
+                if request.get('id') is not None:
+                    server.replies[request['id']] = entry
+                    while len(server.replies) > REPLY_CACHE:
+                        server.replies.popitem(last=False)
+        if first:
+            try:
+                entry[1] = {"result": getattr(server.state, request['op'])(*request['args'])}
+            except Exception as e:
+                entry[1] = {"error": f'{type(e).__name__}: {e}'}
+            entry[0].set()
+        else:
+            entry[0].wait()
+        return entry[1]
+
+
+def serve(path, settings_file=SHARED_STATE_FILE):
+    if os.path.exists(path):
+        # 이미 떠 있는 서버의 소켓이면 그대로 두고, 주인 없는 소켓 파일이면 지운다
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise SystemExit(f'이미 실행 중인 공유 상태 서버가 있습니다: {path}')
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+        finally:
+            probe.close()
+    server = socketserver.ThreadingUnixStreamServer(path, _Handler)
+    server.daemon_threads = True
+    server.state = LocalState(settings_file)
+    server.replies = OrderedDict()  # 요청 id -> [처리 끝남 Event, 응답]
+    server.replies_lock = threading.Lock()
+    # 종료 신호에도 소켓 파일을 지우고 끝낸다
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1] if len(sys.argv) > 1 else SHARED_SOCKET or 'nation_shared.sock')
@@ -0,0 +1,1347 @@
+import bisect
+import heapq
+import itertools
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import jsonio
+from archive import Archive
+from changefeed import ChangeFeed
+from metrics import registry as metrics
+from moderation import REPORTS_DB_FILE, ReportStore
+from search import PostIndex, query_tokens, rank
+from shards import SECTION_PREFIX, LazySections
+from timeindex import TimeIndex, add_days, normalize_timestamp
+from timeseries import SeriesStore
+from writer import GroupCommitWriter, completed
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 스레드 잠금만 사용
+    fcntl = None
+
+# ==========================================
+# 국가 데이터 저장소
+# ==========================================
+# 모든 변경은 작은 연산(op) 레코드로 표현되고 저장 백엔드가 이를 반영한다.
+#   - json   : 스냅샷(nation_data.json) + 저널(nation_data.journal). 기본값.
+#   - sqlite : nation_data.db (WAL). 최초 실행 시 JSON 에서 한 번 이관한다.
+# 백엔드는 NATION_STORAGE 환경 변수로 고른다.
+#
+# JSON 백엔드에서 저널이 일정 크기를 넘으면 백그라운드에서 스냅샷으로
+# 접어 넣는다(compaction). 시작 시에는 스냅샷을 읽은 뒤 저널을 재생한다.
+# 기준은 연산 수(NATION_JOURNAL_COMPACT)와 저널 크기(NATION_JOURNAL_COMPACT_BYTES 와 스냅샷 크기 중 큰 쪽)다.
+# 가져오기의 일괄 연산은 하나로 세므로, 큰 묶음은 연산 수가 아니라 크기로 접힌다.
+#
+# 백엔드 객체는 프로세스 전체가 하나를 공유한다(app.py 의 st.cache_resource).
+# 모든 읽기/쓰기는 객체 잠금 아래에서 이루어지고, 다른 프로세스가 파일을
+# 바꾸면 refresh() 가 이를 감지해 다시 읽는다.
+#
+# JSON 백엔드의 저널 기록은 그룹 커밋 기록기(writer.py)가 맡는다. commit() 은
+# 메모리에 바로 반영하고 Future 를 돌려주며, 기록기는 커밋 창마다 모인 연산을
+# 한 번의 write + fsync 로 저널에 붙인다. 여러 서버 프로세스가 같은 파일을
+# 쓰므로 파일 접근은 nation_data.lock 에 대한 flock 으로 보호하고, 각 프로세스는
+# 다른 프로세스가 붙인 저널 꼬리를 읽어 따라간다.
+#
+# details 의 각 섹션은 따로 저장되고 처음 접근할 때 읽는다 (shards.py).
+#   - json   : nation_details/<섹션>.json. 디렉터리가 없으면 스냅샷의 details(초기값)로 만든다.
+#   - sqlite : meta 테이블의 'details.<섹션>' 행
+#
+# JSON 백엔드에서 오래된 게시글은 compaction 때 압축 세그먼트로 옮겨진다 (archive.py).
+#
+# 국방력 / 경제 지표 수정은 지표 이력(timeseries.py)에도 한 행씩 쌓인다 (두 백엔드 공통, nation_series/).
+#
+# 반영된 연산은 저장소의 변경 기록(changefeed.py)에도 남아, 세션이 새 연산만 받아 화면을 갱신한다.
+#
+# 게시글 시각은 초 단위다. 예전 데이터의 밀리초 시각은 처음 열 때 한 번 바꿔 저장한다.
+# 기간 조회와 날짜별 활동 통계는 시간 색인(timeindex.py)을 쓴다.
+#
+# 신고 내역은 국가 데이터에 넣지 않고 moderation.ReportStore 가 따로 보관한다 (두 백엔드 모두 nation_reports.db).
+# SQLite 백엔드는 그 파일을 연결에 붙여(ATTACH) 피드 조회에서 숨김 글을 바로 걸러낸다. 따로 두는 것은
+# 신고 기록이 nation_data.db 의 data_version 을 바꿔 다른 프로세스를 깨우지 않도록 하기 위해서다.
+#
+# SQLite 백엔드의 commit 은 연산을 changes 테이블에도 남긴다 (JSON 백엔드의 저널에 해당).
+# 다른 프로세스는 data_version 이 바뀌면 자기가 본 마지막 seq 뒤의 행만 읽어 메모리(검색 색인, meta)에 반영한다.
+# 기록은 최근 NATION_SQLITE_CHANGES_KEEP 개만 두고, 그보다 뒤처졌거나 이관처럼 기록 없이 바뀐 경우
+# ('reload' 행)에는 전부 다시 읽는다.
+
+DATA_FILE = 'nation_data.json'
+JOURNAL_FILE = 'nation_data.journal'
+LOCK_FILE = 'nation_data.lock'
+DETAILS_DIR = 'nation_details'
+DB_FILE = os.environ.get('NATION_DB_FILE', 'nation_data.db')
+STORAGE_BACKEND = os.environ.get('NATION_STORAGE', 'json')
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('NATION_JOURNAL_COMPACT', '500'))
+JOURNAL_COMPACT_BYTES = int(os.environ.get('NATION_JOURNAL_COMPACT_BYTES', str(1 << 20)))
+COMMIT_WINDOW = float(os.environ.get('NATION_COMMIT_WINDOW', '0.02'))
+SQLITE_CHANGES_KEEP = int(os.environ.get('NATION_SQLITE_CHANGES_KEEP', '1000'))
+
+CATEGORY_ALL = None
+POSTS_PER_PAGE = 20
+USERS_PER_PAGE = 50
+# 내보내기에서 SQLite 를 한 번에 읽는 행 수
+EXPORT_CHUNK = 1000
+
+# 접두어 검색의 상한 (가장 큰 유니코드 문자)
+_PREFIX_END = '\U0010ffff'
+
+_lock = threading.Lock()
+
+
+# --- 연산 적용 ---
+# 재생은 멱등이어야 한다: 스냅샷 교체 직후 저널을 비우기 전에 멈춰도
+# 같은 레코드를 다시 적용했을 때 결과가 달라지지 않는다.
+
+def _add_post(data, op):
+    post = op['post']
+    posts = data['posts']
+    if any(p['id'] == post['id'] for p in posts):
+        return
+    # 보통은 맨 앞. 다른 프로세스와 시각이 엇갈린 글도 최신 글 순서를 지키도록 제자리에 넣는다
+    key = post_cursor(post)
+    i = 0
+    while i < len(posts) and post_cursor(posts[i]) > key:
+        i += 1
+    posts.insert(i, post)
+
+
+def _op_posts(op):
+    return op['posts'] if op['op'] == 'add_posts' else [op['post']]
+
+
+def _add_posts(data, op):
+    # 일괄 가져오기. 오래된 글이 섞여 들어오므로 새 글만 정렬해 (최신 글이 앞인) 기존 목록과 합친다
+    known = {p['id'] for p in data['posts']}
+    new = []
+    for post in op['posts']:
+        if post['id'] not in known:
+            known.add(post['id'])
+            new.append(post)
+    if new:
+        new.sort(key=post_cursor, reverse=True)
+        data['posts'] = list(heapq.merge(data['posts'], new, key=post_cursor, reverse=True))
+
+
+def _delete_post(data, op):
+    data['posts'] = [p for p in data['posts'] if p['id'] != op['id']]
+
+
+def _report_post(data, op):
+    # 예전 저널 호환용. 새 신고는 ReportStore 에 기록되고, 적재 시 post['reports'] 는 그쪽으로 옮겨진다.
+    for post in data['posts']:
+        if post['id'] == op['id']:
+            reports = post.setdefault('reports', [])
+            if op['report'] not in reports:
+                reports.append(op['report'])
+            return
+
+
+# 시민 연산은 username -> 시민 dict 색인(by_name)을 함께 갱신한다.
+# 일괄 발급/추방은 연산 하나(저널 한 줄, 트랜잭션 하나)로 기록된다.
+
+def _op_users(op):
+    return op['users'] if op['op'] == 'add_users' else [op['user']]
+
+
+def _op_usernames(op):
+    return op['usernames'] if op['op'] == 'delete_users' else [op['username']]
+
+
+def _add_users(data, op, by_name):
+    users = data.setdefault('users', [])
+    for user in _op_users(op):
+        if user['username'] in by_name:
+            continue
+        users.append(user)
+        by_name[user['username']] = user
+
+
+def _delete_users(data, op, by_name):
+    names = {n for n in _op_usernames(op) if n in by_name}
+    if not names:
+        return
+    data['users'] = [u for u in data['users'] if u['username'] not in names]
+    for name in names:
+        del by_name[name]
+
+
+def _set_password(data, op, by_name):
+    user = by_name.get(op['username'])
+    if user:
+        user['password'] = op['password']
+
+
+def _update(data, op):
+    # path 로 가리킨 dict 에 values 를 덮어쓴다 (예: ["details", "military", "numerical"])
+    if op['path'][0] not in data:
+        # details 를 섹션 파일로 옮긴 뒤의 스냅샷: 예전 저널의 details 수정은 이미 섹션에 반영되어 있다
+        return
+    target = data
+    for key in op['path']:
+        target = target[key]
+    target.update(op['values'])
+
+
+OPS = {
+    'add_post': _add_post,
+    'add_posts': _add_posts,
+    'delete_post': _delete_post,
+    'report_post': _report_post,
+    'update': _update,
+}
+
+USER_OPS = {
+    'add_user': _add_users,
+    'add_users': _add_users,
+    'delete_user': _delete_users,
+    'delete_users': _delete_users,
+    'set_password': _set_password,
+}
+
+
+def index_users(data):
+    return {u['username']: u for u in data.get('users', [])}
+
+
+def apply_op(data, op, by_name=None):
+    kind = op['op']
+    if kind in USER_OPS:
+        if by_name is None:
+            by_name = index_users(data)
+        USER_OPS[kind](data, op, by_name)
+    else:
+        OPS[kind](data, op)
+
+
+# --- 파일 입출력 ---
+
+@contextmanager
+def _file_lock(exclusive):
+    # 같은 프로세스 안의 스레드는 _lock 으로, 다른 프로세스와는 flock 으로 직렬화한다
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(LOCK_FILE, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_journal(start=0):
+    # start 위치부터 읽은 연산들과 다 읽은 위치를 돌려준다.
+    # 줄바꿈으로 끝나지 않은 마지막 줄은 아직 기록 중이거나 중단된 것이므로 건너뛴다.
+    if not os.path.exists(JOURNAL_FILE):
+        return [], 0
+    ops = []
+    pos = start
+    with open(JOURNAL_FILE, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ops.append(jsonio.loads(line))
+            except ValueError:
+                continue
+    return ops, pos
+
+
+def _read_snapshot():
+    with open(DATA_FILE, 'rb') as f:
+        return jsonio.loads(f.read())
+
+
+# 스냅샷은 최상위 항목(stats, posts, users) 하나를 한 줄에 쓴다.
+#   {
+#   "stats":{...},
+#   "posts":[...]
+#   }
+# 전체로도 올바른 JSON 이고, 줄 단위로 나누면 항목별 원본 바이트를 얻을 수 있어서
+# compaction 은 저널 연산이 건드린 항목만 다시 직렬화한다.
+
+def _op_part(op):
+    # 연산이 바꾸는 스냅샷 최상위 항목
+    kind = op['op']
+    if kind in USER_OPS:
+        return 'users'
+    if kind == 'update':
+        return op['path'][0]
+    return 'posts'
+
+
+def _read_snapshot_parts():
+    # {항목: 직렬화된 bytes}. 예전 형식(들여쓰기)이면 None
+    with open(DATA_FILE, 'rb') as f:
+        lines = f.read().rstrip(b'\n').split(b'\n')
+    if len(lines) < 2 or lines[0] != b'{' or lines[-1] != b'}':
+        return None
+    parts = {}
+    for line in lines[1:-1]:
+        if not line.startswith(b'"'):
+            return None
+        key, _, raw = line.rstrip(b',').partition(b':')
+        parts[jsonio.loads(key)] = raw
+    return parts
+
+
+def _write_snapshot_parts(parts):
+    # 임시 파일에 쓴 뒤 교체하여 중간 상태가 남지 않게 한다
+    body = b'{\n' + b',\n'.join(jsonio.dumps(k) + b':' + raw for k, raw in parts.items()) + b'\n}\n'
+    tmp = DATA_FILE + '.tmp'
+    with metrics.timer('save', target='snapshot'), open(tmp, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    metrics.inc('bytes_written_total', len(body), target='snapshot')
+    os.replace(tmp, DATA_FILE)
+
+
+def _replay(data, ops):
+    by_name = index_users(data)
+    for op in ops:
+        apply_op(data, op, by_name)
+    return data
+
+
+def load_data():
+    # 스냅샷 + 저널 + details 섹션 + 보관된 글 전체 (SQLite 이관, 벤치마크용)
+    if not os.path.exists(DATA_FILE):
+        return None
+    with _file_lock(exclusive=False):
+        data = _read_snapshot()
+        ops, _ = _read_journal()
+        if os.path.isdir(DETAILS_DIR):
+            data['details'] = _shard_details()
+        archive = Archive(post_cursor)
+        archived = list(archive.iter_posts())
+    data = _replay(data, ops)
+    if archive.watermark is not None:
+        data['posts'] = [p for p in data['posts'] if post_cursor(p) > archive.watermark] + archived
+    _normalize_posts(data['posts'])
+    return data
+
+
+def _shard_path(name):
+    return os.path.join(DETAILS_DIR, name + '.json')
+
+
+def _shard_names():
+    return [f[:-len('.json')] for f in os.listdir(DETAILS_DIR) if f.endswith('.json')]
+
+
+def _read_shard(name):
+    with open(_shard_path(name), 'rb') as f:
+        return jsonio.loads(f.read())
+
+
+def _shard_details():
+    # 예전 버전이 스냅샷에서 뺀 details 를 섹션 파일에서 되살릴 때 (다시 만들 때의 초기값)
+    return {name: _read_shard(name) for name in _shard_names()}
+
+
+def _write_shard(name, section, directory=DETAILS_DIR):
+    path = os.path.join(directory, name + '.json')
+    tmp = path + '.tmp'
+    body = jsonio.dumps(section)
+    with metrics.timer('save', target='shard'), open(tmp, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    metrics.inc('bytes_written_total', len(body), target='shard')
+    os.replace(tmp, path)
+
+
+def split_details():
+    # 스냅샷 안의 details 로 섹션 파일들을 만든다. 디렉터리 이름 교체로 한 번에 드러낸다.
+    # 스냅샷(저장소에 함께 관리되는 nation_data.json)의 details 는 지우지 않고 초기값으로 남겨 두므로,
+    # 섹션 디렉터리가 없어지면(새로 받은 저장소, git clean 등) 다음 실행 때 초기값에서 다시 만든다.
+    if os.path.isdir(DETAILS_DIR) or not os.path.exists(DATA_FILE):
+        return
+    with _file_lock(exclusive=True):
+        if os.path.isdir(DETAILS_DIR):
+            return
+        data = _replay(_read_snapshot(), _read_journal()[0])
+        tmp = DETAILS_DIR + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, section in data.get('details', {}).items():
+            _write_shard(name, section, tmp)
+        os.replace(tmp, DETAILS_DIR)
+
+
+def save_data(data):
+    # 전체 스냅샷 기록
+    parts = {}
+    for key, value in data.items():
+        parts[key] = jsonio.dumps(value)
+        metrics.inc('snapshot_parts_serialized_total', part=key)
+    _write_snapshot_parts(parts)
+
+
+def _normalize_posts(posts):
+    # 밀리초 시각을 초로 바꾸고 바뀐 글 수를 돌려준다 (순서는 부르는 쪽이 맞춘다)
+    changed = 0
+    for post in posts:
+        ts = normalize_timestamp(post['timestamp'])
+        if ts != post['timestamp']:
+            post['timestamp'] = ts
+            changed += 1
+    return changed
+
+
+def _move_reports(data, moderation):
+    # 게시글에 붙어 있던 예전 형식의 신고 목록을 ReportStore 로 옮기고 게시글에서 뗀다
+    moderation.import_reports(data['posts'])
+    for post in data['posts']:
+        post.pop('reports', None)
+
+
+def _archive_cold(data, archive):
+    # 오래된 글을 세그먼트로 옮기고 스냅샷에는 최신 글만 남긴다
+    posts = sorted(data['posts'], key=post_cursor, reverse=True)
+    if archive.watermark is not None:
+        fresh = [p for p in posts if post_cursor(p) > archive.watermark]
+        if len(fresh) < len(posts):
+            # watermark 이전 글: 세그먼트를 쓴 뒤 멈춰 남은 중복이면 건너뛰고,
+            # 늦게 들어온 오래된 글(가져오기)이면 세그먼트로 옮긴다
+            if archive.import_posts(posts[len(fresh):]):
+                archive.consolidate()
+        posts = fresh
+    hot, cold = archive.split_cold(posts)
+    if cold:
+        archive.append(cold)
+    data['posts'] = hot
+
+
+def compact(moderation, archive, force=False):
+    # 디스크의 스냅샷 + 저널을 합쳐 새 스냅샷을 만든다. 호출하는 쪽이 배타적 파일 잠금을 잡고 있어야 한다.
+    # 프로세스마다 메모리 상태가 다를 수 있으므로 메모리가 아닌 파일 기준으로 접는다.
+    # 스냅샷이 항목별 줄 형식이면 저널이 건드린 항목만 읽고 다시 직렬화한다.
+    # 게시글을 다시 쓰는 김에 오래된 글을 보관 세그먼트로 옮긴다. force 면 저널이 비어 있어도 게시글을 정리한다.
+    ops, _ = _read_journal()
+    if not ops and not force:
+        return
+    parts = _read_snapshot_parts()
+    if parts is None:
+        # 예전 형식: 한 번은 전체를 다시 쓴다
+        data = _replay(_read_snapshot(), ops)
+        _normalize_posts(data['posts'])
+        _move_reports(data, moderation)
+        if 'details' not in data and os.path.isdir(DETAILS_DIR):
+            data['details'] = _shard_details()
+        _archive_cold(data, archive)
+        save_data(data)
+    else:
+        dirty = {_op_part(op) for op in ops} & {'posts', 'users', 'stats'}
+        if force:
+            dirty.add('posts')
+        data = {key: jsonio.loads(parts[key]) for key in dirty if key in parts}
+        if 'details' not in parts and os.path.isdir(DETAILS_DIR):
+            parts['details'] = jsonio.dumps(_shard_details())
+        _replay(data, ops)
+        if 'posts' in data:
+            _normalize_posts(data['posts'])
+            _archive_cold(data, archive)
+        for key, value in data.items():
+            parts[key] = jsonio.dumps(value)
+            metrics.inc('snapshot_parts_serialized_total', part=key)
+        _write_snapshot_parts(parts)
+    open(JOURNAL_FILE, 'w', encoding='utf-8').close()
+
+
+def post_cursor(post):
+    # 피드 정렬 키이자 페이지 커서: (시각, id) 내림차순
+    return (post['timestamp'], post['id'])
+
+
+def _range_bound(cursor, until):
+    # 페이지 커서와 기간 끝(until, 초) 중 더 이른 쪽. 이 키보다 오래된 글부터 읽는다
+    bound = None if cursor is None else tuple(cursor)
+    if until is not None and (bound is None or (until, '') < bound):
+        bound = (until, '')
+    return bound
+
+
+# ==========================================
+# 백엔드 구현
+# ==========================================
+# 두 백엔드는 같은 인터페이스를 가진다.
+#   data                      : stats / details 를 담은 dict (details 는 섹션별 지연 적재 Mapping)
+#   version                   : 데이터가 바뀔 때마다 증가하는 번호
+#   part_version(part)        : 항목('stats', 'posts', 'users', 'details.<섹션>')이 바뀔 때마다 증가하는 번호.
+#                               화면 캐시(render.page_cache)는 그리는 항목의 번호를 키로 쓴다
+#   changes                   : 변경 기록 (changefeed.ChangeFeed). since(seq) 로 seq 이후의 연산을 얻는다
+#   series                    : 국방/경제 지표 이력 (timeseries.SeriesStore)
+#   refresh()                 : 다른 프로세스의 변경을 감지하면 반영
+#   flush()                   : 받은 변경이 모두 기록될 때까지 대기
+#   get_user(username)        : 시민 dict 또는 None (username 색인 조회)
+#   list_users(prefix, offset, limit)
+#                             : ID 접두어로 거른 시민 목록 (ID 순)
+#   count_users(prefix)       : 위 목록의 전체 인원
+#   list_posts(category=None) : 최신 글부터
+#   page_posts(category, cursor, limit, since, until)
+#                             : cursor 다음부터 limit 개와 다음 페이지 커서(없으면 None).
+#                               since/until(초) 이 있으면 그 기간 [since, until) 의 글만
+#   search_posts(query, category=None)
+#                             : 검색어와 관련도 순으로 정렬된 글 목록
+#   commit(op)                : 변경 연산 반영. 기록이 끝나면 완료되는 Future 를 돌려준다
+#   get_post(post_id)         : 게시글 dict 또는 None
+#   iter_posts(category, since, until)
+#                             : 내보내기용. 숨김 글까지 모든 글을 최신 글부터 하나씩 (since/until 은 초 단위 시각)
+#   iter_users()              : 내보내기용. 시민을 하나씩
+#   import_posts(posts)       : 가져오기. 이미 있는 id 는 건너뛴다. Future 를 돌려준다
+#   finish_import()           : 게시글 가져오기를 마친 뒤 한 번 (보관 세그먼트 정리)
+#   post_days(since)          : 날짜('YYYY-MM-DD') -> {카테고리: 글 수}. since 가 있으면 그 날짜부터
+#   export()                  : stats / details / posts / users 전체를 담은 dict (관리자 내보내기)
+#   report(post_id, report)   : 신고 기록. 처음 신고한 시민이면 True (같은 시민의 중복 신고는 False)
+#   most_reported(limit)      : [(게시글, 신고 수, 숨김 여부)] 신고 수 내림차순
+#   reports_for(post_id)      : 게시글의 신고 상세 (최근 순)
+#   dismiss_reports(post_id)  : 신고 기각. 신고 내역을 지우고 숨김을 푼다
+# 신고 수가 임계값(NATION_REPORT_HIDE_THRESHOLD)에 닿아 숨겨진 글은 page_posts /
+# search_posts 결과에서 빠진다.
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _journal_size():
+    sig = _file_signature(JOURNAL_FILE)
+    return sig[1] if sig else 0
+
+
+def _split_page(page, limit):
+    # limit + 1 개를 읽어 다음 페이지가 있는지 판단한다
+    if len(page) > limit:
+        return page[:limit], post_cursor(page[limit - 1])
+    return page, None
+
+
+class _Versioned:
+    # 전체 버전과 항목별 버전을 함께 올린다. self.version / self._part_versions 를 사용한다.
+    def _touch(self, *parts):
+        self.version += 1
+        for part in parts:
+            self._part_versions[part] = self._part_versions.get(part, 0) + 1
+
+    def part_version(self, part):
+        return self._part_versions.get(part, 0)
+
+
+def _op_key(op):
+    # 연산이 바꾸는 항목 (part_version 의 키)
+    if op['op'] == 'update' and op['path'][0] == 'details':
+        return SECTION_PREFIX + op['path'][1]
+    return _op_part(op)
+
+
+class _Moderated:
+    # 신고 관련 메서드 (두 백엔드 공통). self.moderation 과 get_post() 를 사용한다.
+    def report(self, post_id, report):
+        return self.moderation.report(post_id, report['reporter'], report['reason'], report['timestamp'])
+
+    def most_reported(self, limit=20):
+        rows = []
+        for post_id, count, hidden in self.moderation.most_reported(limit):
+            post = self.get_post(post_id)
+            if post is not None:
+                rows.append((post, count, hidden))
+        return rows
+
+    def reports_for(self, post_id):
+        return self.moderation.reports_for(post_id)
+
+    def dismiss_reports(self, post_id):
+        self.moderation.dismiss(post_id)
+
+
+class JsonStorage(_Versioned, _Moderated):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = 0
+        self._part_versions = {}
+        self._pending = []  # 메모리에는 반영했지만 아직 저널에 기록되지 않은 연산
+        self.changes = ChangeFeed()
+        self.series = SeriesStore()
+        self.moderation = ReportStore(REPORTS_DB_FILE)
+        split_details()
+        self._shard_sigs = {}  # 읽어 둔 섹션 -> 파일 서명 (다른 프로세스의 수정 감지용)
+        self.details = LazySections(_shard_names() if os.path.isdir(DETAILS_DIR) else (), self._load_shard)
+        self.archive = Archive(post_cursor)
+        self._load()
+        if self.data and (self._unnormalized or self.archive.needs_migration()
+                          or self.archive.split_cold(self.data['posts'])[1]):
+            # 밀리초 시각이 남아 있거나 보관 기준을 넘는 글이 쌓여 있으면(예전 데이터, 설정 변경)
+            # 시작할 때 한 번 바꿔 저장한다
+            with _file_lock(exclusive=True), self._lock:
+                self.archive.migrate()
+                compact(self.moderation, self.archive, force=True)
+                self._load_locked()
+        self._writer = GroupCommitWriter(self._write_batch, COMMIT_WINDOW)
+
+    def _load(self):
+        with _file_lock(exclusive=False), self._lock:
+            self._load_locked()
+
+    @metrics.timed('load', backend='json')
+    def _load_locked(self):
+        old_stats = self.data['stats'] if getattr(self, 'data', None) else None
+        self._snapshot_sig = _file_signature(DATA_FILE)
+        self._unnormalized = 0
+        if self._snapshot_sig is None:
+            self.data = None
+            self._journal_pos = self._journal_ops = 0
+        else:
+            self.data = _read_snapshot()
+            ops, self._journal_pos = _read_journal()
+            self._journal_ops = len(ops)
+            _replay(self.data, ops + self._pending)
+            self._unnormalized = _normalize_posts(self.data['posts'])
+            # 시간 색인은 목록이 정렬 키의 역순이라고 가정한다 (이미 정렬되어 있으면 한 번 훑고 끝난다)
+            self.data['posts'].sort(key=post_cursor, reverse=True)
+            _move_reports(self.data, self.moderation)
+            self.data.pop('details', None)
+            self.data['details'] = self.details
+            self.archive.refresh()
+            self._trim_archived()
+        self.search_index = PostIndex(self.data['posts'] if self.data else ())
+        self.time_index = TimeIndex(self.data['posts'] if self.data else ())
+        self.users_by_name = index_users(self.data) if self.data else {}
+        self.usernames = sorted(self.users_by_name)
+        # 다시 읽어도 stats 가 그대로면 그 항목의 화면 캐시는 살려 둔다 (details 섹션은 따로 적재된다)
+        self._touch('posts', 'users', *(('stats',) if not self.data or self.data['stats'] != old_stats else ()))
+        self.changes.reset()
+
+    def _trim_archived(self):
+        # watermark 이하의 글은 세그먼트로 옮겨졌으므로 메모리의 최신 글 목록에서 뺀다
+        wm = self.archive.watermark
+        posts = self.data['posts']
+        if wm is None or not posts or min(post_cursor(posts[0]), post_cursor(posts[-1])) > wm:
+            return []
+        self.data['posts'] = [p for p in posts if post_cursor(p) > wm]
+        return [p for p in posts if post_cursor(p) <= wm]
+
+    def _forget_archived(self):
+        # 세그먼트로 옮겨진 글을 최신 글 목록과 색인에서 뺀다
+        for post in self._trim_archived():
+            self.search_index.remove(post['id'])
+            self.time_index.remove(post['id'])
+
+    def _apply(self, op):
+        apply_op(self.data, op, self.users_by_name)
+        if op['op'] in ('add_user', 'add_users', 'delete_user', 'delete_users'):
+            self.usernames = sorted(self.users_by_name)
+        self.search_index.apply(op)
+        self.time_index.apply(op)
+        self._touch(_op_key(op))
+        self.changes.publish(op)
+
+    def _stale(self):
+        return (_file_signature(DATA_FILE) != self._snapshot_sig
+                or _journal_size() != self._journal_pos)
+
+    def _catch_up(self):
+        # 다른 프로세스가 붙인 저널 꼬리만 읽어 반영한다. 스냅샷이 바뀌었으면(compaction) 새로 읽는다.
+        size = _journal_size()
+        if _file_signature(DATA_FILE) != self._snapshot_sig or size < self._journal_pos:
+            self._load_locked()
+            return
+        if size == self._journal_pos:
+            return
+        ops, self._journal_pos = _read_journal(self._journal_pos)
+        self._journal_ops += len(ops)
+        for op in ops:
+            self._apply(op)
+
+    def _load_shard(self, name):
+        with _file_lock(exclusive=False):
+            self._shard_sigs[name] = _file_signature(_shard_path(name))
+            return _read_shard(name)
+
+    def _refresh_shards(self):
+        # 읽어 둔 섹션만 확인한다 (재실행마다 많아야 섹션 수만큼의 stat)
+        for name in self.details.loaded():
+            if _file_signature(_shard_path(name)) != self._shard_sigs.get(name):
+                self.details.drop(name)
+                with self._lock:
+                    self._touch(SECTION_PREFIX + name)
+
+    def _commit_shard(self, op):
+        # details 수정은 저널을 거치지 않고 해당 섹션 파일 하나만 다시 쓴다.
+        # 다른 프로세스의 수정을 덮어쓰지 않도록 잠금 아래에서 파일을 새로 읽어 고친다.
+        name = op['path'][1]
+        with _file_lock(exclusive=True), self._lock:
+            os.makedirs(DETAILS_DIR, exist_ok=True)
+            section = _read_shard(name) if os.path.exists(_shard_path(name)) else {}
+            _update({'details': {name: section}}, op)
+            _write_shard(name, section)
+            self.series.record(op, {name: section})
+            self._shard_sigs[name] = _file_signature(_shard_path(name))
+            self.details.put(name, section)
+            self._touch(SECTION_PREFIX + name)
+            self.changes.publish(op)
+        return completed()
+
+    def _delete_archived(self, post_id):
+        # 보관된 글은 세그먼트를 고치지 않고 색인에 삭제 표시만 한다
+        with _file_lock(exclusive=True), self._lock:
+            if self.archive.delete(post_id):
+                self._touch('posts')
+                self.changes.publish({"op": "delete_post", "id": post_id})
+        return completed()
+
+    def refresh(self):
+        self.moderation.refresh()
+        self.series.refresh()
+        self._refresh_shards()
+        if self.archive.refresh():
+            with self._lock:
+                self._forget_archived()
+                self._touch('posts')
+        if not self._stale():
+            return
+        with _file_lock(exclusive=False), self._lock:
+            self._catch_up()
+
+    def get_user(self, username):
+        with self._lock:
+            return self.users_by_name.get(username)
+
+    def _prefix_range(self, prefix):
+        if not prefix:
+            return 0, len(self.usernames)
+        return (bisect.bisect_left(self.usernames, prefix),
+                bisect.bisect_left(self.usernames, prefix + _PREFIX_END))
+
+    def list_users(self, prefix='', offset=0, limit=None):
+        with self._lock:
+            start, end = self._prefix_range(prefix)
+            start += offset
+            if limit is not None:
+                end = min(end, start + limit)
+            return [self.users_by_name[n] for n in self.usernames[start:end]]
+
+    def count_users(self, prefix=''):
+        with self._lock:
+            start, end = self._prefix_range(prefix)
+            return end - start
+
+    def list_posts(self, category=CATEGORY_ALL):
+        # 보관된 글까지 모두 (세그먼트를 전부 푼다)
+        with self._lock:
+            posts = itertools.chain(self.data['posts'], self.archive.iter_posts(category))
+            if category is CATEGORY_ALL:
+                return list(posts)
+            return [p for p in posts if p['category'] == category]
+
+    def _posts_from(self, category, bound, since):
+        # bound 보다 오래된 글을 최신 글부터, since 이전 글이 나오면 멈춘다.
+        # 최신 글 목록의 시작 위치는 시간 색인으로 찾고, 모자랄 때만 보관 세그먼트로 넘어간다
+        hot = self.data['posts']
+        start = 0 if bound is None else len(hot) - self.time_index.count_before(bound)
+        posts = itertools.chain((hot[i] for i in range(start, len(hot))), self.archive.iter_posts(category, bound))
+        if since is not None:
+            posts = itertools.takewhile(lambda p: p['timestamp'] >= since, posts)
+        if category is not CATEGORY_ALL:
+            posts = (p for p in posts if p['category'] == category)
+        return posts
+
+    def page_posts(self, category=CATEGORY_ALL, cursor=None, limit=POSTS_PER_PAGE, since=None, until=None):
+        # 목록은 최신 글이 앞에 오므로 커서(또는 기간 끝) 이전 글은 건너뛰고 필요한 만큼만 읽는다.
+        with self._lock:
+            posts = self._posts_from(category, _range_bound(cursor, until), since)
+            hidden = self.moderation.hidden
+            if hidden:
+                posts = (p for p in posts if p['id'] not in hidden)
+            page = list(itertools.islice(posts, limit + 1))
+        return _split_page(page, limit)
+
+    def search_posts(self, query, category=CATEGORY_ALL):
+        # 최신 글은 메모리 색인으로, 보관된 글은 아카이브의 합친 토큰 목록으로 찾아 함께 순위를 매긴다.
+        # 보관된 글 검색(세그먼트 읽기)은 저장소 잠금 밖에서 한다
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        with self._lock:
+            matched = self.search_index.match(tokens)
+            hidden = self.moderation.hidden
+        archived = self.archive.search(tokens, category)
+        return [p for p in rank(matched, archived, category, load=self.archive.load) if p['id'] not in hidden]
+
+    def get_post(self, post_id):
+        with self._lock:
+            post = self.search_index.posts.get(post_id)
+            return post if post is not None else self.archive.find(post_id)
+
+    def export(self):
+        return {"stats": self.data['stats'], "details": dict(self.details),
+                "posts": self.list_posts(), "users": list(self.data.get('users', []))}
+
+    def iter_posts(self, category=CATEGORY_ALL, since=None, until=None):
+        # 최신 글 목록은 기간에 드는 부분의 참조만 복사하고, 보관된 글은 세그먼트를 하나씩 푼다
+        bound = _range_bound(None, until)
+        with self._lock:
+            hot = self.data['posts']
+            hot = hot[len(hot) - self.time_index.count_before(bound):] if bound is not None else list(hot)
+        posts = itertools.chain(hot, self.archive.iter_posts(category, bound))
+        if since is not None:
+            posts = itertools.takewhile(lambda p: p['timestamp'] >= since, posts)
+        if category is not CATEGORY_ALL:
+            posts = (p for p in posts if p['category'] == category)
+        return posts
+
+    def post_days(self, since=None):
+        # 최신 글의 시간 색인과 보관 세그먼트 요약을 더한다 (글을 다시 세지 않는다)
+        with self._lock:
+            days = self.archive.day_counts()
+            add_days(days, self.time_index.days)
+        return {day: counts for day, counts in days.items() if (since is None or day >= since) and any(counts.values())}
+
+    def iter_users(self):
+        with self._lock:
+            users = list(self.data.get('users', []))
+        return iter(users)
+
+    def import_posts(self, posts):
+        # 보관 기준(watermark)보다 오래된 글은 바로 세그먼트로, 나머지는 add_posts 연산으로 반영한다
+        with _file_lock(exclusive=True), self._lock:
+            self.archive.refresh()
+            hot_ids, archived = self.search_index.posts, self.archive.ids()
+            posts = [p for p in posts if p['id'] not in hot_ids and p['id'] not in archived]
+            wm = self.archive.watermark
+            cold = [p for p in posts if wm is not None and post_cursor(p) <= wm]
+            if cold and self.archive.import_posts(cold):
+                self._touch('posts')
+        hot = [p for p in posts if wm is None or post_cursor(p) > wm]
+        if hot:
+            return self.commit({"op": "add_posts", "posts": hot})
+        return completed()
+
+    def finish_import(self):
+        # 가져오기로 생긴, 시간 범위가 겹치는 세그먼트를 합쳐 둔다
+        with _file_lock(exclusive=True), self._lock:
+            self.archive.refresh()
+            if self.archive.consolidate():
+                self._touch('posts')
+
+    def commit(self, op):
+        # 메모리에는 바로 반영하고, 저널 기록이 끝나면 완료되는 Future 를 돌려준다
+        if op['op'] == 'delete_post':
+            self.moderation.dismiss(op['id'])
+        metrics.inc('writes_total', op=op['op'])
+        if op['op'] == 'update' and op['path'][0] == 'details':
+            return self._commit_shard(op)
+        if op['op'] == 'delete_post' and op['id'] not in self.search_index.posts:
+            return self._delete_archived(op['id'])
+        with self._lock:
+            self._apply(op)
+            self._pending.append(op)
+            return self._writer.submit(op)
+
+    def _write_batch(self, ops):
+        # 기록기 스레드에서 커밋 창마다 한 번 호출된다
+        lines = b''.join(jsonio.dumps(op) + b'\n' for op in ops)
+        with _file_lock(exclusive=True), self._lock:
+            try:
+                self._catch_up()
+                with metrics.timer('save', target='journal'), open(JOURNAL_FILE, 'ab') as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._journal_pos = f.tell()
+                metrics.inc('bytes_written_total', len(lines), target='journal')
+            finally:
+                # 실패한 묶음은 Future 로 알리고 대기열에서 뺀다
+                del self._pending[:len(ops)]
+            self._journal_ops += len(ops)
+            if self._journal_ops >= JOURNAL_COMPACT_THRESHOLD or self._journal_pos >= self._compact_bytes():
+                compact(self.moderation, self.archive)
+                self._snapshot_sig = _file_signature(DATA_FILE)
+                self._journal_pos = self._journal_ops = 0
+                self._forget_archived()
+
+    def _compact_bytes(self):
+        # 저널이 스냅샷보다 커지면 접는다 (가져오기처럼 큰 연산이 몰려도 스냅샷을 다시 쓰는 양이 저널에 비례하게)
+        return max(JOURNAL_COMPACT_BYTES, self._snapshot_sig[1] if self._snapshot_sig else 0)
+
+    def flush(self):
+        # 지금까지 받은 변경이 모두 저널에 기록될 때까지 기다린다
+        self._writer.wait()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    author TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_category_ts ON posts (category, timestamp);
+CREATE INDEX IF NOT EXISTS idx_posts_ts ON posts (timestamp);
+CREATE TABLE IF NOT EXISTS post_days (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL
+);
+"""
+
+# 날짜별 글 수는 posts 에 행이 들어가고 빠질 때 트리거로 함께 고친다 (INSERT OR IGNORE 로 무시된 행은 세지 않는다).
+# 날짜는 서버 지역 시각 기준 (timeindex.day_of 와 같다)
+POST_DAY_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS post_days_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO post_days VALUES (date(NEW.timestamp, 'unixepoch', 'localtime'), NEW.category, 1)
+        ON CONFLICT (day, category) DO UPDATE SET count = count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_days_delete AFTER DELETE ON posts BEGIN
+        UPDATE post_days SET count = count - 1
+        WHERE day = date(OLD.timestamp, 'unixepoch', 'localtime') AND category = OLD.category;
+    END""",
+)
+
+POST_COLUMNS = 'id, author, title, content, timestamp, category'
+
+
+def _post_row(post):
+    return (post['id'], post['author'], post['title'], post['content'],
+            normalize_timestamp(post['timestamp']), post['category'])
+
+
+def _post_dict(row):
+    return {"id": row[0], "author": row[1], "title": row[2], "content": row[3],
+            "timestamp": row[4], "category": row[5]}
+
+
+def _user_dict(row):
+    return {"username": row[0], "password": row[1], "createdAt": row[2]}
+
+
+class SqliteStorage(_Versioned, _Moderated):
+    def __init__(self, db_file=DB_FILE):
+        # Streamlit 은 재실행마다 다른 스레드에서 스크립트를 돌리므로 연결을 잠금으로 보호한다
+        self._lock = threading.RLock()
+        self.version = 0
+        self._part_versions = {}
+        self.changes = ChangeFeed()
+        self.series = SeriesStore()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.moderation = ReportStore(REPORTS_DB_FILE)
+        migrate_reports_table(self.conn, self.moderation)
+        # 신고 파일은 읽기 전용으로만 쓴다 (PRAGMA data_version 은 main 만 보므로 신고 기록에 반응하지 않는다)
+        self.conn.execute('ATTACH DATABASE ? AS moderation', (self.moderation.db_file,))
+        changed = self.conn.total_changes
+        split_details_row(self.conn)
+        normalize_posts_table(self.conn)
+        create_post_days(self.conn)
+        if self.conn.execute('SELECT COUNT(*) FROM meta').fetchone()[0] == 0:
+            source = load_data()
+            if source is None:
+                self.data = None
+                return
+            migrate_json(self.conn, source)
+            self.moderation.import_reports(source['posts'])
+        if self.conn.total_changes != changed:
+            # 이관으로 바뀐 내용은 연산 기록이 없으므로 떠 있는 다른 프로세스가 전부 다시 읽게 한다
+            with self.conn:
+                self._log_change({"op": "reload"})
+        self._load()
+
+    @metrics.timed('load', backend='sqlite')
+    def _load(self):
+        # data_version 은 다른 연결이 커밋할 때만 바뀐다. 변경 기록 위치는 데이터보다 먼저 읽는다
+        # (그 사이 커밋된 연산은 다음 _catch_up 이 한 번 더 반영한다. 같은 연산을 다시 반영해도 결과는 같다)
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self._change_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+        old_details = self.data['details'] if getattr(self, 'data', None) else None
+        old_raw, self._meta_raw = getattr(self, '_meta_raw', {}), {}
+        self.data = {}
+        sections = []
+        changed = ['posts', 'users']
+        for (key,) in self.conn.execute('SELECT key FROM meta').fetchall():
+            if key.startswith(SECTION_PREFIX):
+                sections.append(key[len(SECTION_PREFIX):])
+            else:
+                self.data[key] = jsonio.loads(self._meta_text(key))
+                if self._meta_raw[key] != old_raw.get(key):
+                    changed.append(key)
+        self.data['details'] = LazySections(sections, lambda name: jsonio.loads(self._meta_text(SECTION_PREFIX + name)))
+        # 읽어 둔 섹션은 행이 그대로면 옮겨 두어 그 섹션의 화면 캐시를 살린다
+        for name in old_details.loaded() if old_details is not None else ():
+            key = SECTION_PREFIX + name
+            if name in sections and self._meta_text(key) == old_raw.get(key):
+                self.data['details'].put(name, old_details[name])
+            else:
+                changed.append(key)
+        self.search_index = PostIndex(self.list_posts())
+        self._touch(*changed)
+        # 다른 연결이 무엇을 바꿨는지는 알 수 없으므로 변경 기록을 끊는다
+        self.changes.reset()
+
+    def _meta_text(self, key):
+        # 다시 읽을 때 바뀐 항목을 가려내도록 읽은 원문을 남긴다
+        with self._lock:
+            self._meta_raw[key] = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()[0]
+            return self._meta_raw[key]
+
+    def refresh(self):
+        self.moderation.refresh()
+        self.series.refresh()
+        with self._lock:
+            if self.conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+                self._catch_up()
+
+    def _catch_up(self):
+        # 다른 연결이 남긴 변경 기록 중 아직 못 본 행만 반영한다.
+        # 기록이 잘려 이어지지 않거나 'reload' 행이 있으면 전부 다시 읽는다
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        rows = self.conn.execute('SELECT seq, op FROM changes WHERE seq > ? ORDER BY seq',
+                                 (self._change_seq,)).fetchall()
+        if not rows:
+            return
+        ops = [jsonio.loads(raw) for _, raw in rows]
+        if rows[0][0] != self._change_seq + 1 or any(op['op'] == 'reload' for op in ops):
+            self._load()
+            return
+        for op in ops:
+            self._apply(op)
+        self._change_seq = rows[-1][0]
+        metrics.inc('catch_up_ops_total', len(ops), backend='sqlite')
+
+    def _apply(self, op):
+        # 다른 연결이 커밋한 연산. 행은 이미 DB 에 있으므로 메모리에 둔 것(검색 색인, meta 값)만 고친다
+        if op['op'] == 'update':
+            if op['path'][0] == 'details':
+                name = op['path'][1]
+                self.data['details'].put(name, jsonio.loads(self._meta_text(SECTION_PREFIX + name)))
+            else:
+                self.data[op['path'][0]] = jsonio.loads(self._meta_text(op['path'][0]))
+        self.search_index.apply(op)
+        self._touch(_op_key(op))
+        self.changes.publish(op)
+
+    def _log_change(self, op):
+        # 열린 쓰기 트랜잭션 안에서 부른다. 오래된 기록은 같은 트랜잭션에서 지운다
+        self._change_seq = self.conn.execute('INSERT INTO changes (op) VALUES (?)',
+                                             (jsonio.dumps(op).decode('utf-8'),)).lastrowid
+        self.conn.execute('DELETE FROM changes WHERE seq <= ?', (self._change_seq - SQLITE_CHANGES_KEEP,))
+
+    def get_post(self, post_id):
+        with self._lock:
+            row = self.conn.execute(f'SELECT {POST_COLUMNS} FROM posts WHERE id = ?', (post_id,)).fetchone()
+        return _post_dict(row) if row else None
+
+    def export(self):
+        return {"stats": self.data['stats'], "details": dict(self.data['details']),
+                "posts": self.list_posts(), "users": self.list_users()}
+
+    def iter_posts(self, category=CATEGORY_ALL, since=None, until=None):
+        # EXPORT_CHUNK 행씩 (시각, id) 커서로 이어 읽는다. 읽는 동안에만 연결 잠금을 잡는다
+        where, params = [], []
+        if category is not CATEGORY_ALL:
+            where.append('category = ?')
+            params.append(category)
+        if since is not None:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('timestamp < ?')
+            params.append(until)
+        cursor = None
+        while True:
+            conds, args = list(where), list(params)
+            if cursor is not None:
+                conds.append('(timestamp < ? OR (timestamp = ? AND id < ?))')
+                args += [cursor[0], cursor[0], cursor[1]]
+            sql = f'SELECT {POST_COLUMNS} FROM posts'
+            if conds:
+                sql += ' WHERE ' + ' AND '.join(conds)
+            sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+            with self._lock:
+                rows = self.conn.execute(sql, args + [EXPORT_CHUNK]).fetchall()
+            for row in rows:
+                yield _post_dict(row)
+            if len(rows) < EXPORT_CHUNK:
+                return
+            cursor = (rows[-1][4], rows[-1][0])
+
+    def import_posts(self, posts):
+        # INSERT OR IGNORE 는 있던 행을 남기지만 검색 색인은 연산의 글로 바뀌므로, 있는 id 는 미리 뺀다
+        new = {}
+        with self._lock:
+            for i in range(0, len(posts), EXPORT_CHUNK):
+                ids = [p['id'] for p in posts[i:i + EXPORT_CHUNK]]
+                known = {r[0] for r in self.conn.execute(
+                    f'SELECT id FROM posts WHERE id IN ({",".join("?" * len(ids))})', ids)}
+                for post in posts[i:i + EXPORT_CHUNK]:
+                    if post['id'] not in known:
+                        new.setdefault(post['id'], post)
+        if not new:
+            return completed()
+        return self.commit({"op": "add_posts", "posts": list(new.values())})
+
+    def finish_import(self):
+        pass
+
+    def iter_users(self):
+        last = ''
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    'SELECT username, password, created_at FROM users WHERE username > ? ORDER BY username LIMIT ?',
+                    (last, EXPORT_CHUNK)
+                ).fetchall()
+            for row in rows:
+                yield _user_dict(row)
+            if len(rows) < EXPORT_CHUNK:
+                return
+            last = rows[-1][0]
+
+    def get_user(self, username):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT username, password, created_at FROM users WHERE username = ?', (username,)
+            ).fetchone()
+        return _user_dict(row) if row else None
+
+    def _prefix_where(self, prefix):
+        # 접두어 검색을 기본 키 범위 조회로 바꿔 색인을 타게 한다
+        if not prefix:
+            return '', []
+        return ' WHERE username >= ? AND username < ?', [prefix, prefix + _PREFIX_END]
+
+    def list_users(self, prefix='', offset=0, limit=None):
+        where, params = self._prefix_where(prefix)
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT username, password, created_at FROM users{where} ORDER BY username LIMIT ? OFFSET ?',
+                params + [-1 if limit is None else limit, offset]
+            ).fetchall()
+        return [_user_dict(r) for r in rows]
+
+    def count_users(self, prefix=''):
+        where, params = self._prefix_where(prefix)
+        with self._lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM users{where}', params).fetchone()[0]
+
+    def list_posts(self, category=CATEGORY_ALL):
+        with self._lock:
+            if category is CATEGORY_ALL:
+                rows = self.conn.execute(
+                    f'SELECT {POST_COLUMNS} FROM posts ORDER BY timestamp DESC'
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    f'SELECT {POST_COLUMNS} FROM posts WHERE category = ? ORDER BY timestamp DESC',
+                    (category,)
+                ).fetchall()
+        return [_post_dict(r) for r in rows]
+
+    def page_posts(self, category=CATEGORY_ALL, cursor=None, limit=POSTS_PER_PAGE, since=None, until=None):
+        where, params = ['id NOT IN (SELECT post_id FROM moderation.report_counts WHERE hidden = 1)'], []
+        if category is not CATEGORY_ALL:
+            where.append('category = ?')
+            params.append(category)
+        if since is not None:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('timestamp < ?')
+            params.append(until)
+        if cursor is not None:
+            ts, post_id = cursor
+            where.append('(timestamp < ? OR (timestamp = ? AND id < ?))')
+            params += [ts, ts, post_id]
+        sql = f'SELECT {POST_COLUMNS} FROM posts WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return _split_page([_post_dict(r) for r in rows], limit)
+
+    def search_posts(self, query, category=CATEGORY_ALL):
+        with self._lock:
+            hidden = self.moderation.hidden
+            return [p for p in self.search_index.search(query, category) if p['id'] not in hidden]
+
+    def post_days(self, since=None):
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT day, category, count FROM post_days WHERE day >= ? AND count > 0', (since or '',)
+            ).fetchall()
+        days = {}
+        for day, category, count in rows:
+            days.setdefault(day, {})[category] = count
+        return days
+
+    def commit(self, op):
+        kind = op['op']
+        metrics.inc('writes_total', op=kind)
+        if kind == 'delete_post':
+            self.moderation.dismiss(op['id'])
+        with metrics.timer('save', target='sqlite'), self._lock, self.conn:
+            # 쓰기 잠금을 먼저 잡아, 아래에서 읽는 행이 커밋할 때까지 다른 연결에 의해 바뀌지 않게 한다.
+            # 그 전에 다른 연결이 커밋한 연산을 먼저 반영해 변경 기록의 seq 가 이어지게 한다
+            self.conn.execute('BEGIN IMMEDIATE')
+            if self.conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+                self._catch_up()
+            if kind in ('add_post', 'add_posts'):
+                self.conn.executemany(
+                    f'INSERT OR IGNORE INTO posts ({POST_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)',
+                    [_post_row(p) for p in _op_posts(op)]
+                )
+            elif kind == 'delete_post':
+                self.conn.execute('DELETE FROM posts WHERE id = ?', (op['id'],))
+            elif kind in ('add_user', 'add_users'):
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO users VALUES (?, ?, ?)',
+                    [(u['username'], u['password'], u['createdAt']) for u in _op_users(op)]
+                )
+            elif kind in ('delete_user', 'delete_users'):
+                self.conn.executemany(
+                    'DELETE FROM users WHERE username = ?', [(n,) for n in _op_usernames(op)]
+                )
+            elif kind == 'set_password':
+                self.conn.execute(
+                    'UPDATE users SET password = ? WHERE username = ?', (op['password'], op['username'])
+                )
+            elif kind == 'update':
+                self._update_meta(op)
+            else:
+                raise KeyError(kind)
+            self._log_change(op)
+            self.search_index.apply(op)
+            self._touch(_op_key(op))
+            self.changes.publish(op)
+        # SQLite 는 트랜잭션이 끝나면 이미 기록된 상태다
+        return completed()
+
+    def _update_meta(self, op):
+        # 메모리의 값은 다른 연결의 수정보다 오래됐을 수 있으므로, 지금 행을 읽어 고친 뒤 다시 쓴다.
+        # details 는 고친 섹션 행 하나만 다시 쓴다
+        section = op['path'][1] if op['path'][0] == 'details' else None
+        key = op['path'][0] if section is None else SECTION_PREFIX + section
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        value = jsonio.loads(row[0]) if row else {}
+        _update({key: value} if section is None else {'details': {section: value}}, op)
+        self._meta_raw[key] = jsonio.dumps(value).decode('utf-8')
+        self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, self._meta_raw[key]))
+        if section is None:
+            self.data[key] = value
+        else:
+            self.data['details'].put(section, value)
+            self.series.record(op, {section: value})
+
+    def flush(self):
+        pass
+
+
+def migrate_json(conn, source):
+    # 기존 JSON 데이터(스냅샷 + 저널)를 SQLite 로 한 번에 옮긴다
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                     ('stats', jsonio.dumps(source['stats']).decode('utf-8')))
+        conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+            (SECTION_PREFIX + name, jsonio.dumps(section).decode('utf-8'))
+            for name, section in source['details'].items()
+        ])
+        conn.executemany(
+            'INSERT OR IGNORE INTO users VALUES (?, ?, ?)',
+            [(u['username'], u['password'], u['createdAt']) for u in source.get('users', [])]
+        )
+        conn.executemany(
+            f'INSERT OR IGNORE INTO posts ({POST_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)',
+            [_post_row(p) for p in source['posts']]
+        )
+
+
+def split_details_row(conn):
+    # 예전 형식의 meta 'details' 행 하나를 섹션 행들로 나눈다
+    row = conn.execute("SELECT value FROM meta WHERE key = 'details'").fetchone()
+    if row is None:
+        return
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+            (SECTION_PREFIX + name, jsonio.dumps(section).decode('utf-8'))
+            for name, section in jsonio.loads(row[0]).items()
+        ])
+        conn.execute("DELETE FROM meta WHERE key = 'details'")
+
+
+def normalize_posts_table(conn):
+    # 예전에 밀리초로 들어간 시각이 남아 있으면 초로 바꾼다 (시각 색인 범위 조회라 없으면 바로 끝난다)
+    with conn:
+        conn.execute('UPDATE posts SET timestamp = timestamp / 1000 WHERE timestamp > 10000000000')
+
+
+def create_post_days(conn):
+    # 트리거가 없던 DB 면 날짜별 글 수를 한 번 세어 채운 뒤 트리거를 만든다
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'post_days_insert'").fetchone():
+        return
+    with conn:
+        conn.execute('DELETE FROM post_days')
+        conn.execute(
+            "INSERT INTO post_days SELECT date(timestamp, 'unixepoch', 'localtime'), category, COUNT(*) "
+            'FROM posts GROUP BY 1, 2'
+        )
+        for sql in POST_DAY_TRIGGERS:
+            conn.execute(sql)
+
+
+def migrate_reports_table(conn, moderation):
+    # 예전에 같은 DB 파일에 두던 신고 테이블(reports, post_reports / report_counts)이 남아 있으면
+    # ReportStore 로 옮기고 지운다
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    posts = {}
+    for table in ('reports', 'post_reports'):
+        if table not in tables:
+            continue
+        for post_id, reporter, reason, ts in conn.execute(f'SELECT post_id, reporter, reason, timestamp FROM {table}'):
+            posts.setdefault(post_id, {"id": post_id, "reports": []})['reports'].append(
+                {"reporter": reporter, "reason": reason, "timestamp": ts})
+    if not tables & {'reports', 'post_reports', 'report_counts'}:
+        return
+    moderation.import_reports(list(posts.values()))
+    with conn:
+        for table in ('reports', 'post_reports', 'report_counts'):
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+BACKENDS = {
+    'json': JsonStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def open_storage(backend=STORAGE_BACKEND):
+    return BACKENDS[backend]()
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+from streamlit.testing.v1 import AppTest, app_test
+from streamlit.runtime.media_file_manager import MediaFileManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_MENU = "👑 대통령 집무실"
+
+# ==========================================
+# 대량 내보내기: st.download_button 의 지연 콜백을 실제로 실행해 본다
+# ==========================================
+# AppTest 는 실행이 끝나면 가짜 런타임을 치우므로, 만들어진 MediaFileManager 를 붙잡아 두었다가
+# 버튼의 deferred_file_id 로 콜백을 돌린다 (브라우저가 내려받기를 누른 것과 같은 경로).
+
+
+class _Managers(MediaFileManager):
+    made = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _Managers.made.append(self)
+
+
+# 저장소는 프로세스 전역 하나이므로 앱도 모듈에 하나만 띄운다
+@pytest.fixture(scope='module')
+def admin_app(tmp_path_factory):
+    work = tmp_path_factory.mktemp('nation')
+    shutil.copy(os.path.join(ROOT, 'nation_data.json'), work)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(work)
+        mp.setattr(app_test, 'MediaFileManager', _Managers)
+        at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=60).run()
+        at.sidebar.text_input(key='apw').set_value('admin123').run()
+        at.sidebar.button[1].click().run()
+        at.sidebar.radio[0].set_value(ADMIN_MENU).run()
+        assert not at.exception, at.exception
+        yield at
+
+
+def download(at, file_name):
+    button = next(b for b in at.get('download_button') if b.proto.label == f"{file_name} 내려받기")
+    mgr = _Managers.made[-1]
+    url = mgr.execute_deferred(button.proto.deferred_file_id)
+    file_id = url.rsplit('/', 1)[-1].split('.', 1)[0]
+    return mgr._storage.get_file(file_id).content
+
+
+@pytest.mark.parametrize('target', ["게시글", "시민"])
+@pytest.mark.parametrize('fmt', ["JSONL", "CSV"])
+def test_export_download(admin_app, target, fmt):
+    at = admin_app
+    at.selectbox(key='bulk_target').set_value(target).run()
+    at.selectbox(key='bulk_format').set_value(fmt).run()
+    assert not at.exception, at.exception
+    name = "posts" if target == "게시글" else "users"
+    data = download(at, f"nation_{name}.{fmt.lower()}")
+    assert isinstance(data, bytes)
+    lines = data.decode('utf-8-sig').splitlines()
+    if fmt == "JSONL":
+        records = [json.loads(line) for line in lines]
+        key = 'id' if target == "게시글" else 'username'
+        assert all(key in r for r in records)
+    else:
+        header = 'id,author' if target == "게시글" else 'username,password'
+        assert lines[0].startswith(header)
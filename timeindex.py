@@ -0,0 +1,86 @@
+import bisect
+import time
+
+# ==========================================
+# 게시글 시간 색인 (정렬 키 + 날짜별 글 수)
+# ==========================================
+# 게시글 시각은 초 단위로 통일되어 있다. 초기 데이터의 밀리초 값은 저장소가 처음 열릴 때
+# 한 번 바꿔 둔다 (normalize_timestamp 는 그 이관에만 쓴다).
+#
+# TimeIndex 는 JSON 백엔드가 메모리에 둔 최신 글 목록의 색인이다.
+#   keys : (시각, id) 오름차순. 최신 글이 앞인 글 목록과 순서가 정확히 거꾸로이므로,
+#          기간/커서가 주어지면 목록을 앞에서부터 훑지 않고 이분 탐색으로 시작 위치를 찾는다.
+#   days : 'YYYY-MM-DD'(서버 지역 시각) -> {카테고리: 글 수}. 활동 통계를 글을 다시 세지 않고 낸다.
+# 글 등록/삭제 연산마다 갱신한다. 보관된 글의 날짜별 글 수는 세그먼트 요약에 있다 (archive.py).
+# SQLite 백엔드는 posts 의 시각 색인과 post_days 테이블(트리거로 갱신)이 같은 역할을 한다.
+
+
+def normalize_timestamp(ts):
+    # 초기 게시글은 밀리초, 이후 게시글은 초 단위로 저장되어 있었다
+    return ts / 1000 if ts > 10000000000 else ts
+
+
+def day_of(ts):
+    return time.strftime('%Y-%m-%d', time.localtime(ts))
+
+
+def add_days(days, other, sign=1):
+    # days 에 other 의 날짜별 글 수를 더한다 (sign=-1 이면 뺀다)
+    for day, counts in other.items():
+        bucket = days.setdefault(day, {})
+        for category, n in counts.items():
+            bucket[category] = bucket.get(category, 0) + sign * n
+
+
+def count_days(posts):
+    days = {}
+    for post in posts:
+        bucket = days.setdefault(day_of(post['timestamp']), {})
+        bucket[post['category']] = bucket.get(post['category'], 0) + 1
+    return days
+
+
+class TimeIndex:
+    def __init__(self, posts=()):
+        self.entries = {p['id']: (p['timestamp'], p['category']) for p in posts}
+        self.keys = sorted((ts, post_id) for post_id, (ts, _) in self.entries.items())
+        self.days = count_days(posts)
+
+    def add(self, post):
+        if post['id'] in self.entries:
+            return
+        ts = post['timestamp']
+        self.entries[post['id']] = (ts, post['category'])
+        bisect.insort(self.keys, (ts, post['id']))
+        self._count(ts, post['category'], 1)
+
+    def remove(self, post_id):
+        entry = self.entries.pop(post_id, None)
+        if entry is None:
+            return
+        ts, category = entry
+        i = bisect.bisect_left(self.keys, (ts, post_id))
+        del self.keys[i]
+        self._count(ts, category, -1)
+
+    def _count(self, ts, category, n):
+        day = day_of(ts)
+        bucket = self.days.setdefault(day, {})
+        bucket[category] = bucket.get(category, 0) + n
+        if not bucket[category]:
+            del bucket[category]
+            if not bucket:
+                del self.days[day]
+
+    def apply(self, op):
+        if op['op'] == 'add_post':
+            self.add(op['post'])
+        elif op['op'] == 'add_posts':
+            for post in op['posts']:
+                self.add(post)
+        elif op['op'] == 'delete_post':
+            self.remove(op['id'])
+
+    def count_before(self, bound):
+        # (시각, id) 가 bound 보다 앞(오래된)인 글 수
+        return bisect.bisect_left(self.keys, bound)
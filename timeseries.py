@@ -0,0 +1,208 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import registry as metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 스레드 잠금만 사용
+    fcntl = None
+
+# ==========================================
+# 국방/경제 지표 이력 (열 단위 시계열)
+# ==========================================
+# 관리자가 국방력 / 경제 지표를 수정할 때마다 그 섹션의 수치 지표 전체를 한 행으로 남긴다.
+# 지표마다 float64 열 파일 하나에 값을 이어 붙인다.
+#   nation_series/military/_ts.f64          : 기록 시각 (초)
+#   nation_series/military/troopCount.f64   : 지표 열
+# 시각 열은 마지막에 쓰므로 시각 열의 길이가 완료된 행 수다. 중간에 멈춰 더 길어진
+# 지표 열은 다음 기록 때 잘라낸다. 나중에 생긴 지표의 이전 행은 NaN 이다.
+# "3.2%", "+1,200억 달러" 같은 문자열 지표는 첫 숫자를 값으로 쓴다.
+#
+# 차트는 기간으로 자른 구간을 LTTB 로 CHART_POINTS 개 안팎까지 줄여 그리므로
+# 이력 길이와 관계없이 그리는 비용이 일정하다.
+
+SERIES_DIR = os.environ.get('NATION_SERIES_DIR', 'nation_series')
+LOCK_FILE = 'series.lock'
+TS_COLUMN = '_ts'
+SUFFIX = '.f64'
+DTYPE = np.dtype('<f8')
+CHART_POINTS = 200
+
+# 이력을 남길 수정 경로 -> 시계열 이름
+TRACKED = {
+    ('details', 'military', 'numerical'): 'military',
+    ('details', 'economy', 'stats'): 'economy',
+}
+
+_NUMBER = re.compile(r'[-+]?\d[\d,]*(?:\.\d+)?')
+
+
+def indicator_values(section):
+    # 섹션에서 수치로 읽을 수 있는 지표만 {이름: float}
+    values = {}
+    for key, value in section.items():
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            values[key] = float(value)
+        elif isinstance(value, str):
+            match = _NUMBER.search(value)
+            if match:
+                values[key] = float(match.group().replace(',', ''))
+    return values
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: 첫/마지막 점을 두고 가운데를 n_out - 2 개 구간으로 나눠
+    # 구간마다 (이전에 고른 점, 다음 구간 평균)과 만드는 삼각형이 가장 큰 점을 고른다.
+    # 구간 평균은 한 번에 계산하고, 구간마다의 선택도 numpy 연산 한 번이다.
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1])[:len(counts)] / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1])[:len(counts)] / counts
+    # 다음 구간 평균 (마지막 구간의 다음은 마지막 점)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[prev] - next_x[i]) * (y[lo:hi] - y[prev])
+                      - (x[prev] - x[lo:hi]) * (next_y[i] - y[prev]))
+        prev = lo + int(np.argmax(area))
+        picked[i + 1] = prev
+    return x[picked], y[picked]
+
+
+class Series:
+    # 시계열 하나. columns 는 {지표: 값 배열}, ts 는 시각 배열 (길이가 같다)
+    def __init__(self, directory):
+        self.directory = directory
+        self._sig = None
+        self._load()
+
+    def _path(self, column):
+        return os.path.join(self.directory, column + SUFFIX)
+
+    def _signature(self):
+        try:
+            st = os.stat(self._path(TS_COLUMN))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        # 읽는 쪽은 ts 를 먼저 잡고 열을 ts 길이로 자르므로, 열을 먼저 바꾸고 ts 를 나중에 바꾼다
+        self._sig = self._signature()
+        ts = np.empty(0, DTYPE)
+        columns = {}
+        if self._sig is not None:
+            ts = np.fromfile(self._path(TS_COLUMN), DTYPE)
+            rows = len(ts)
+            for f in sorted(os.listdir(self.directory)):
+                if not f.endswith(SUFFIX) or f == TS_COLUMN + SUFFIX:
+                    continue
+                column = np.fromfile(os.path.join(self.directory, f), DTYPE)[:rows]
+                if len(column) < rows:
+                    column = np.concatenate([np.full(rows - len(column), np.nan), column])
+                columns[f[:-len(SUFFIX)]] = column
+        self.columns = columns
+        self.ts = ts
+
+    @property
+    def rows(self):
+        return len(self.ts)
+
+    def refresh(self):
+        if self._signature() == self._sig:
+            return False
+        self._load()
+        return True
+
+    def append(self, ts, values):
+        # 호출하는 쪽이 배타적 잠금을 잡고 있어야 한다
+        self._load()
+        os.makedirs(self.directory, exist_ok=True)
+        rows = self.rows
+        columns = dict(self.columns)
+        for name in set(columns) | set(values):
+            value = values.get(name, np.nan)
+            with open(self._path(name), 'ab') as f:
+                if name in columns:
+                    f.truncate(rows * DTYPE.itemsize)
+                else:
+                    # 새 지표: 이전 행은 값이 없다
+                    columns[name] = np.full(rows, np.nan)
+                    columns[name].astype(DTYPE).tofile(f)
+                f.write(np.array([value], DTYPE).tobytes())
+            columns[name] = np.append(columns[name], value)
+        with open(self._path(TS_COLUMN), 'ab') as f:
+            f.write(np.array([ts], DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.columns = columns
+        self.ts = np.append(self.ts, ts)
+        self._sig = self._signature()
+
+    def window(self, column, since=None, points=CHART_POINTS):
+        # (시각, 값) — since 이후 구간에서 값이 있는 행만, points 개 안팎으로 줄인 것
+        ts = self.ts
+        start = 0 if since is None else int(np.searchsorted(ts, since))
+        x, y = ts[start:], self.columns[column][start:len(ts)]
+        mask = ~np.isnan(y)
+        return lttb(x[mask], y[mask], points)
+
+
+class SeriesStore:
+    def __init__(self, directory=SERIES_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.series = {name: Series(os.path.join(directory, name)) for name in TRACKED.values()}
+
+    @property
+    def version(self):
+        return sum(s.rows for s in self.series.values())
+
+    def refresh(self):
+        for s in self.series.values():
+            s.refresh()
+
+    def get(self, name):
+        return self.series[name]
+
+    def record(self, op, details):
+        # 수정 연산이 추적하는 경로면 수정 후의 섹션 지표를 한 행으로 남긴다
+        name = TRACKED.get(tuple(op['path']))
+        if name is None:
+            return
+        target = details
+        for key in op['path'][1:]:
+            target = target[key]
+        with self._locked():
+            self.series[name].append(time.time(), indicator_values(target))
+        metrics.inc('series_rows_total', series=name)
+
+    @contextmanager
+    def _locked(self):
+        # 같은 프로세스의 스레드는 스레드 잠금으로, 다른 프로세스와는 flock 으로 직렬화한다
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,79 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# ==========================================
+# 그룹 커밋 기록기
+# ==========================================
+# 여러 세션이 동시에 보낸 변경을 한 스레드가 모아서 커밋 창(window) 단위로
+# 한 번에 기록한다. 호출한 쪽은 Future 를 받아 필요할 때만 기록 완료를 기다린다.
+
+_STOP = object()
+_BARRIER = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, flush, window=0.02, name='nation-writer'):
+        # flush(items) 는 모인 항목을 한 번에 기록한다. 예외를 던지면 그 묶음의 Future 가 실패한다.
+        self._flush = flush
+        self._window = window
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def wait(self):
+        # 앞서 받은 항목이 모두 기록될 때까지 기다린다
+        self.submit(_BARRIER).result()
+
+    def close(self):
+        # 남은 항목을 모두 기록한 뒤 스레드를 끝낸다
+        if self._thread.is_alive():
+            self._queue.put((_STOP, None))
+            self._thread.join()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window
+        while batch[-1][0] is not _STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1][0] is _STOP
+            if stop:
+                batch.pop()
+            items = [item for item, _ in batch if item is not _BARRIER]
+            try:
+                if items:
+                    self._flush(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for _, future in batch:
+                    future.set_result(True)
+            if stop:
+                return
+
+
+def completed(result=True):
+    # 동기식으로 이미 기록을 마친 백엔드가 돌려주는 Future
+    future = Future()
+    future.set_result(result)
+    return future